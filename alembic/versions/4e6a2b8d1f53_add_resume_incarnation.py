@@ -0,0 +1,33 @@
+"""Add resume incarnation
+
+Revision ID: 4e6a2b8d1f53
+Revises: 9b3e7f1c4d26
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e6a2b8d1f53'
+down_revision: Union[str, Sequence[str], None] = '9b3e7f1c4d26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Plain ADD COLUMN, as in e81f4a6c0b39: a batch rebuild of "resumes" on SQLite would drop the FTS triggers.
+    op.add_column('resumes', sa.Column('incarnation', sa.String(length=8), server_default='', nullable=False))
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("UPDATE resumes SET incarnation = lower(hex(randomblob(4)))")
+    else:
+        op.execute("UPDATE resumes SET incarnation = substr(md5(random()::text || id::text), 1, 8)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('resumes', 'incarnation')
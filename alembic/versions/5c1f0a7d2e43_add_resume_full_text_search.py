@@ -0,0 +1,63 @@
+"""Add resume full-text search
+
+Revision ID: 5c1f0a7d2e43
+Revises: ebe188b9d845
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1f0a7d2e43'
+down_revision: Union[str, Sequence[str], None] = 'ebe188b9d845'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(
+            "ALTER TABLE resumes ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+            "(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))) STORED"
+        )
+        op.create_index('ix_resumes_search_vector', 'resumes', ['search_vector'], postgresql_using='gin')
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE resumes_fts USING fts5("
+            "title, description, content='resumes', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER resumes_fts_ai AFTER INSERT ON resumes BEGIN "
+            "INSERT INTO resumes_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER resumes_fts_ad AFTER DELETE ON resumes BEGIN "
+            "INSERT INTO resumes_fts(resumes_fts, rowid, title, description) "
+            "VALUES ('delete', old.id, old.title, old.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER resumes_fts_au AFTER UPDATE ON resumes BEGIN "
+            "INSERT INTO resumes_fts(resumes_fts, rowid, title, description) "
+            "VALUES ('delete', old.id, old.title, old.description); "
+            "INSERT INTO resumes_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END"
+        )
+        op.execute("INSERT INTO resumes_fts(resumes_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_resumes_search_vector', table_name='resumes')
+        op.drop_column('resumes', 'search_vector')
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS resumes_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS resumes_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS resumes_fts_ai")
+        op.execute("DROP TABLE IF EXISTS resumes_fts")
@@ -0,0 +1,30 @@
+"""Add refresh token rotation columns
+
+Revision ID: 9b3e7f1c4d26
+Revises: c8d41f6e2a07
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3e7f1c4d26'
+down_revision: Union[str, Sequence[str], None] = 'c8d41f6e2a07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('refresh_tokens', sa.Column('replaced_by', sa.String(length=32), nullable=True))
+    op.add_column('refresh_tokens', sa.Column('rotated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('refresh_tokens', 'rotated_at')
+    op.drop_column('refresh_tokens', 'replaced_by')
@@ -0,0 +1,38 @@
+"""Create login throttle table
+
+Revision ID: b5e07d3a9c21
+Revises: f3a92c7d5b18
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e07d3a9c21'
+down_revision: Union[str, Sequence[str], None] = 'f3a92c7d5b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('login_throttle',
+    sa.Column('id', sa.String(length=200), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('refilled_at', sa.Float(), nullable=False),
+    sa.Column('window_started_at', sa.Float(), nullable=False),
+    sa.Column('window_count', sa.Integer(), nullable=False),
+    sa.Column('previous_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_login_throttle_refilled_at'), 'login_throttle', ['refilled_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_login_throttle_refilled_at'), table_name='login_throttle')
+    op.drop_table('login_throttle')
@@ -0,0 +1,37 @@
+"""Create improvement cache table
+
+Revision ID: d47b2c9e8a15
+Revises: a3d9e6b1c7f2
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd47b2c9e8a15'
+down_revision: Union[str, Sequence[str], None] = 'a3d9e6b1c7f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('improvement_cache',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('improver_version', sa.String(length=32), nullable=False),
+    sa.Column('description', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_improvement_cache_expires_at'), 'improvement_cache', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_improvement_cache_expires_at'), table_name='improvement_cache')
+    op.drop_table('improvement_cache')
@@ -0,0 +1,33 @@
+"""Add resume version and updated_at
+
+Revision ID: e81f4a6c0b39
+Revises: d47b2c9e8a15
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e81f4a6c0b39'
+down_revision: Union[str, Sequence[str], None] = 'd47b2c9e8a15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Plain ADD COLUMN with constant defaults: a batch rebuild of "resumes" on SQLite would drop the FTS triggers.
+    op.add_column('resumes', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('resumes', sa.Column('updated_at', sa.DateTime(), server_default='1970-01-01 00:00:00',
+                                       nullable=False))
+    op.execute("UPDATE resumes SET updated_at = CURRENT_TIMESTAMP")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('resumes', 'updated_at')
+    op.drop_column('resumes', 'version')
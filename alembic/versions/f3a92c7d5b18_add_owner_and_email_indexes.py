@@ -0,0 +1,31 @@
+"""Add resumes (owner_id, id) and users lower(email) indexes
+
+Revision ID: f3a92c7d5b18
+Revises: e81f4a6c0b39
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a92c7d5b18'
+down_revision: Union[str, Sequence[str], None] = 'e81f4a6c0b39'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_resumes_owner_id_id', 'resumes', ['owner_id', 'id'])
+    # Fails if existing emails differ only by case; those accounts have to be merged first.
+    op.create_index('ux_users_email_lower', 'users', [sa.text('lower(email)')], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_users_email_lower', table_name='users')
+    op.drop_index('ix_resumes_owner_id_id', table_name='resumes')
@@ -1,35 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException
+import math
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 
 from app_v1.core import db_helper
-from app_v1.models import User
+from app_v1.core.query_budget import query_budget
 from app_v1.schemas.user import UserCreate, UserLogin
-from app_v1.auth.model.token_model import Token
-from app_v1.auth.service.jwt_service import create_access_token, get_password_hash, verify_password, verify_access_token
+from app_v1.auth.model.token_model import Token, RefreshRequest
+from app_v1.auth.service.jwt_service import (verify_and_update_password_async, issue_tokens, rotate_refresh_token,
+                                             revoke_refresh_token)
+from app_v1.auth.service.rate_limit import login_limiter, client_ip
+from app_v1.repositories import user_repository
 
 router = APIRouter(tags=["JWT Auth"])
 
 
 @router.post("/register")
-async def register(user: UserCreate, session: AsyncSession = Depends(db_helper.get_scoped_session)):
-    result = await session.execute(select(User).where(User.email == user.email))
-    if result.scalars().first():
+@query_budget(2)
+async def register(user: UserCreate, session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
+    if await user_repository.get_user_by_email(session, user.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    try:
+        await user_repository.create_user(session, user)
+    except user_repository.EmailAlreadyRegistered:
         raise HTTPException(status_code=400, detail="Email already registered")
-
-    new_user = User(name=user.name, email=user.email, password=get_password_hash(user.password))
-    session.add(new_user)
-    await session.commit()
     return {"msg": "User registered successfully"}
 
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(),
-                session: AsyncSession = Depends(db_helper.get_scoped_session)):
-    result = await session.execute(select(User).where(User.email == form_data.username))
-    db_user = result.scalars().first()
-    if not db_user or not verify_password(form_data.password, db_user.password):
+@query_budget(3)
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(),
+                session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
+    wait = await login_limiter.check(client_ip(request), form_data.username)
+    if wait:
+        raise HTTPException(status_code=429, detail="Too many login attempts",
+                            headers={"Retry-After": str(math.ceil(wait))})
+    db_user = await user_repository.get_user_by_email(session, form_data.username)
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await verify_and_update_password_async(form_data.password, db_user.password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = create_access_token({"sub": db_user.email})
-    return {"access_token": token, "token_type": "bearer"}
+    if new_hash:
+        await user_repository.update_password_hash(session, db_user, new_hash)
+    await login_limiter.succeeded(form_data.username)
+    return await issue_tokens(session, db_user.email, db_user.id)
+
+
+@router.post("/refresh", response_model=Token)
+@query_budget(4)
+async def refresh(body: RefreshRequest):
+    return await rotate_refresh_token(body.refresh_token)
+
+
+@router.post("/logout", status_code=204)
+@query_budget(1)
+async def logout(body: RefreshRequest, session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
+    await revoke_refresh_token(session, body.refresh_token)
+    return Response(status_code=204)
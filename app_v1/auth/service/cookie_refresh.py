@@ -0,0 +1,77 @@
+import time
+
+from fastapi import HTTPException, Response
+from starlette.datastructures import Headers
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app_v1.core import settings
+from app_v1.core.query_budget import extend_query_budget
+from .jwt_service import decode_jwt_token, rotate_refresh_token
+
+
+def set_auth_cookies(response: Response, tokens: dict) -> None:
+    response.set_cookie(key="access_token", value=tokens["access_token"], httponly=True)
+    response.set_cookie(key="refresh_token", value=tokens["refresh_token"], httponly=True,
+                        max_age=settings.jwt_response_token_expire_days * 24 * 3600)
+
+
+def clear_auth_cookies(response: Response) -> None:
+    response.delete_cookie("access_token")
+    response.delete_cookie("refresh_token")
+
+
+def needs_refresh(access_token: str | None, refresh_before: float) -> bool:
+    if not access_token:
+        return True
+    try:
+        payload = decode_jwt_token(access_token)
+    except HTTPException:
+        return True
+    return payload.get("exp", 0) - time.time() < refresh_before
+
+
+class CookieRefreshMiddleware:
+    # Web flow only (no Authorization header): swaps an expiring access_token cookie for a fresh pair before
+    # the route runs, so the page keeps working without another password login.
+    def __init__(self, app: ASGIApp, refresh_before: float = 300):
+        self.app = app
+        self.refresh_before = refresh_before
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        cookies = cookie_parser(headers.get("cookie", ""))
+        refresh_token = cookies.get("refresh_token")
+        if (not refresh_token or "authorization" in headers
+                or not needs_refresh(cookies.get("access_token"), self.refresh_before)):
+            await self.app(scope, receive, send)
+            return
+
+        # Rotation: the user lookup, one UPDATE and one INSERT, plus an occasional prune of expired rows.
+        extend_query_budget(4)
+        cookie_headers = Response()
+        try:
+            tokens = await rotate_refresh_token(refresh_token)
+        except HTTPException:
+            tokens = None
+        if tokens is None:
+            clear_auth_cookies(cookie_headers)
+            cookies.pop("access_token", None)
+            cookies.pop("refresh_token", None)
+        else:
+            set_auth_cookies(cookie_headers, tokens)
+            cookies.update(access_token=tokens["access_token"], refresh_token=tokens["refresh_token"])
+        # Changed in place: the outer middleware reads scope["route"] once the router has set it.
+        scope["headers"] = [(name, value) for name, value in scope["headers"] if name != b"cookie"]
+        scope["headers"].append((b"cookie", "; ".join(f"{name}={value}" for name, value in cookies.items()).encode()))
+        set_cookies = [(name, value) for name, value in cookie_headers.raw_headers if name == b"set-cookie"]
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), *set_cookies]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
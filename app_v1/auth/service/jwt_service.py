@@ -1,19 +1,34 @@
+import asyncio
+import hashlib
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
-from sqlalchemy import select
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app_v1.core.config import settings
 from app_v1.core import db_helper
+from app_v1.core.cache import Cache, TTLCache
+from app_v1.core.shared_cache import shared_store, invalidation_bus
+from app_v1.core.metrics import password_hash_duration, jwt_duration
 from app_v1.models import User
+from app_v1.schemas.user import User as Principal
+from app_v1.repositories import refresh_token_repository
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+principal_cache = Cache("principal", maxsize=settings.principal_cache_max_size, ttl=settings.principal_cache_ttl_seconds,
+                        store=shared_store, bus=invalidation_bus, lock_ms=settings.cache_lock_ms, model=Principal)
+token_cache = TTLCache(maxsize=settings.token_cache_max_size, ttl=settings.jwt_access_token_expire_minutes * 60)
+
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -23,26 +38,121 @@ def verify_password(password: str, hashed_password: str) -> bool:
     return pwd_context.verify(password, hashed_password)
 
 
+class PasswordHashStats:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.max_run_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.pending - self.workers)
+
+    def record(self, wait: float, run: float) -> None:
+        self.completed += 1
+        self.wait_seconds += wait
+        self.run_seconds += run
+        self.max_run_seconds = max(self.max_run_seconds, run)
+
+    def snapshot(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "in_flight": self.pending,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_seconds": self.wait_seconds / completed,
+            "avg_run_seconds": self.run_seconds / completed,
+            "max_run_seconds": self.max_run_seconds,
+        }
+
+
+password_hash_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers,
+                                            thread_name_prefix="password-hash")
+password_hash_stats = PasswordHashStats(workers=settings.password_hash_workers)
+
+
+def _timed_call(func, args):
+    started = time.perf_counter()
+    result = func(*args)
+    return started, time.perf_counter(), result
+
+
+async def _run_in_hash_pool(func, *args):
+    if password_hash_stats.pending >= settings.password_hash_max_pending:
+        password_hash_stats.rejected += 1
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server is busy, try again later")
+    password_hash_stats.pending += 1
+    submitted = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        started, finished, result = await loop.run_in_executor(password_hash_executor, _timed_call, func, args)
+    finally:
+        password_hash_stats.pending -= 1
+    password_hash_stats.record(wait=started - submitted, run=finished - started)
+    password_hash_duration.observe(finished - started, func.__name__)
+    return result
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_in_hash_pool(pwd_context.hash, password)
+
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    return await _run_in_hash_pool(pwd_context.verify, password, hashed_password)
+
+
+async def verify_and_update_password_async(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    # Returns a new hash when the stored one uses a different cost factor than bcrypt_rounds.
+    return await _run_in_hash_pool(pwd_context.verify_and_update, password, hashed_password)
+
+
+@lru_cache(maxsize=None)
+def _jwt_key(key: str):
+    # Parsing the PEM is most of an RS256 call (~60 ms per encode); PyJWT accepts the parsed key object as is.
+    return jwt.get_algorithm_by_name(settings.jwt_algorithm).prepare_key(key)
+
+
+def _encode(claims: dict) -> str:
+    started = time.perf_counter()
+    encoded_jwt = jwt.encode(claims, _jwt_key(settings.jwt_private_key), algorithm=settings.jwt_algorithm)
+    jwt_duration.observe(time.perf_counter() - started, "encode")
+    return encoded_jwt
+
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=settings.jwt_access_token_expire_minutes)
     to_encode.update({"exp": expire, "iat": datetime.utcnow()})
-    encoded_jwt = jwt.encode(to_encode, settings.jwt_private_key, algorithm=settings.jwt_algorithm)
-    return encoded_jwt
+    return _encode(to_encode)
 
 
-def decode_access_token(token: str) -> dict:
-    return jwt.decode(token, settings.jwt_public_key, algorithms=[settings.jwt_algorithm])
+def create_refresh_token(email: str, user_id: int, token_id: str | None = None,
+                         expires_at: datetime | None = None) -> tuple[str, str, datetime]:
+    token_id = token_id or uuid.uuid4().hex
+    expires_at = expires_at or datetime.utcnow() + timedelta(days=settings.jwt_response_token_expire_days)
+    token = _encode({"sub": email, "uid": user_id, "jti": token_id, "type": "refresh", "exp": expires_at,
+                     "iat": datetime.utcnow()})
+    return token, token_id, expires_at
 
 
-def verify_access_token(token: str = Depends(oauth2_scheme)):
+def decode_jwt_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
+    started = time.perf_counter()
     try:
         payload = jwt.decode(
             token,
-            settings.jwt_public_key,
+            _jwt_key(settings.jwt_public_key),
             algorithms=[settings.jwt_algorithm]
         )
-        return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -53,37 +163,124 @@ def verify_access_token(token: str = Depends(oauth2_scheme)):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
+    finally:
+        jwt_duration.observe(time.perf_counter() - started, "decode")
+    exp = payload.get("exp")
+    if exp is not None:
+        token_cache.set(key, payload, ttl=exp - time.time())
+    return payload
 
 
-def decode_jwt_token(token: str) -> dict:
-    try:
-        payload = jwt.decode(
-            token,
-            settings.jwt_public_key,
-            algorithms=[settings.jwt_algorithm]
-        )
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token expired"
-        )
-    except jwt.InvalidTokenError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token"
-        )
+def verify_access_token(token: str = Depends(oauth2_scheme)):
+    payload = decode_jwt_token(token)
+    if payload.get("type") == "refresh":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    return payload
+
+
+def decode_refresh_token(token: str) -> dict:
+    payload = decode_jwt_token(token)
+    if payload.get("type") != "refresh" or "jti" not in payload or "uid" not in payload:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    return payload
+
+
+class RefreshTokenPruner:
+    def __init__(self, every: int):
+        self.every = every
+        self.issued = 0
+
+    async def issued_one(self, session: AsyncSession) -> None:
+        self.issued += 1
+        if self.issued >= self.every:
+            self.issued = 0
+            await refresh_token_repository.delete_expired_refresh_tokens(session)
+
+
+refresh_token_pruner = RefreshTokenPruner(every=settings.jwt_refresh_prune_every)
+
+
+def _token_pair(email: str, refresh_token: str) -> dict:
+    return {"access_token": create_access_token({"sub": email}), "refresh_token": refresh_token,
+            "token_type": "bearer"}
+
+
+async def issue_tokens(session: AsyncSession, email: str, user_id: int, token_id: str | None = None) -> dict:
+    refresh_token, token_id, expires_at = create_refresh_token(email, user_id, token_id)
+    await refresh_token_repository.add_refresh_token(session, token_id, user_id, expires_at)
+    await refresh_token_pruner.issued_one(session)
+    await session.commit()
+    tokens = _token_pair(email, refresh_token)
+    await db_helper.mark_recent_write(tokens["access_token"])
+    return tokens
+
+
+async def _rotate(session: AsyncSession, token: str) -> dict:
+    payload = decode_refresh_token(token)
+    # The pair is issued for the account the token was issued to, under its current email: "sub" is only the
+    # email at login time and may belong to another account by now.
+    user = await session.get(User, payload["uid"])
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    new_token_id = uuid.uuid4().hex
+    if await refresh_token_repository.consume_refresh_token(session, payload["jti"], user.id, new_token_id):
+        return await issue_tokens(session, user.email, user.id, new_token_id)
+
+    # Requests racing with the same refresh token (parallel tabs, fragment loads, other workers) get the token
+    # that replaced it, re-signed, instead of looking like a replay.
+    grace_start = datetime.utcnow() - timedelta(seconds=settings.jwt_refresh_grace_seconds)
+    replacement = await refresh_token_repository.get_replacement(session, payload["jti"], user.id, grace_start)
+    if replacement is not None:
+        refresh_token, _, _ = create_refresh_token(user.email, user.id, replacement.id, replacement.expires_at)
+        return _token_pair(user.email, refresh_token)
+
+    # A validly signed token that is no longer usable has been used before: treat it as leaked and end every
+    # session of its user.
+    await refresh_token_repository.revoke_user_refresh_tokens(session, user.id)
+    await session.commit()
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token revoked")
+
+
+async def rotate_refresh_token(token: str) -> dict:
+    # Its own session: the rotation commits on its own, whatever the calling request does with its session.
+    async with db_helper.session_factory() as session:
+        return await _rotate(session, token)
+
+
+async def revoke_refresh_token(session: AsyncSession, token: str) -> None:
+    payload = decode_refresh_token(token)
+    await refresh_token_repository.revoke_refresh_token(session, payload["jti"])
+    await session.commit()
+
+
+async def get_user_by_subject(session: AsyncSession, email: str) -> Principal | None:
+    # Only id, name and email are cached: the password hash stays in the database.
+    async def load() -> Principal | None:
+        result = await session.execute(select(User).where(func.lower(User.email) == func.lower(email)))
+        user = result.scalars().first()
+        return Principal.model_validate(user) if user is not None else None
+
+    return await principal_cache.get_or_load(email, load)
+
+
+async def invalidate_principal(*emails: str) -> None:
+    await principal_cache.invalidate(*emails)
 
 
 async def get_current_user(token: str = Depends(verify_access_token),
-                           session: AsyncSession = Depends(db_helper.get_scoped_session)) -> User:
+                           session: AsyncSession = Depends(db_helper.scoped_session_dependency)) -> Principal:
     payload = token
     email = payload.get("sub")
     if email is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    result = await session.execute(select(User).where(User.email == email))
-    user = result.scalars().first()
+    user = await get_user_by_subject(session, email)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
+
+
+async def get_current_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
+    if current_user.email.lower() not in {email.lower() for email in settings.admin_emails}:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
@@ -0,0 +1,216 @@
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import Request
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app_v1.core import db_helper, settings
+from app_v1.core.metrics import login_attempts
+from app_v1.core.query_budget import extend_query_budget
+from app_v1.models import LoginThrottle
+
+
+@dataclass(frozen=True)
+class LimitRule:
+    burst: int
+    per_second: float
+    window_seconds: float
+    window_limit: int
+
+    @property
+    def idle_seconds(self) -> float:
+        # After this long without attempts the state is back to a fresh one and can be dropped.
+        return max(2 * self.window_seconds, self.burst / self.per_second)
+
+
+class BucketState:
+    __slots__ = ("tokens", "refilled_at", "window_started_at", "window_count", "previous_count")
+
+    def __init__(self, tokens: float, refilled_at: float, window_started_at: float, window_count: int = 0,
+                 previous_count: int = 0):
+        self.tokens = tokens
+        self.refilled_at = refilled_at
+        self.window_started_at = window_started_at
+        self.window_count = window_count
+        self.previous_count = previous_count
+
+
+def admit(state: BucketState | None, rule: LimitRule, now: float) -> tuple[BucketState, float]:
+    # Returns the state with this attempt counted and 0, or the state unchanged and the seconds to wait.
+    if state is None:
+        state = BucketState(tokens=rule.burst, refilled_at=now, window_started_at=now)
+    tokens = min(rule.burst, state.tokens + (now - state.refilled_at) * rule.per_second)
+
+    # Sliding window approximated from the current and previous fixed windows.
+    started, current, previous = state.window_started_at, state.window_count, state.previous_count
+    passed = int((now - started) // rule.window_seconds)
+    if passed:
+        previous = current if passed == 1 else 0
+        current = 0
+        started += passed * rule.window_seconds
+    remaining = started + rule.window_seconds - now
+    estimated = previous * remaining / rule.window_seconds + current
+
+    wait = 0.0
+    if tokens < 1:
+        wait = (1 - tokens) / rule.per_second
+    if estimated + 1 > rule.window_limit:
+        # The previous window's share decays linearly; once the window rolls over the client asks again.
+        decay = (estimated + 1 - rule.window_limit) * rule.window_seconds / previous if previous else remaining
+        wait = max(wait, min(decay, remaining))
+    if wait:
+        return state, wait
+    return BucketState(tokens - 1, now, started, current + 1, previous), 0.0
+
+
+class RateLimitBackend(ABC):
+    @abstractmethod
+    async def hit(self, keys: list[tuple[str, LimitRule]]) -> tuple[float, str | None]:
+        """Count one attempt for every key, or for none if any key is over its limit.
+
+        Returns the seconds to wait and the limiting key, or (0, None) when the attempt is allowed.
+        """
+
+    @abstractmethod
+    async def reset(self, key: str) -> None:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.evictions = 0
+        self._states: OrderedDict[str, BucketState] = OrderedDict()
+
+    async def hit(self, keys: list[tuple[str, LimitRule]]) -> tuple[float, str | None]:
+        now = time.monotonic()
+        admitted = []
+        for key, rule in keys:
+            state, wait = admit(self._states.get(key), rule, now)
+            if wait:
+                return wait, key
+            admitted.append((key, state))
+        for key, state in admitted:
+            self._states[key] = state
+            self._states.move_to_end(key)
+        while len(self._states) > self.max_keys:
+            self._states.popitem(last=False)
+            self.evictions += 1
+        return 0.0, None
+
+    async def reset(self, key: str) -> None:
+        self._states.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"keys": len(self._states), "max_keys": self.max_keys, "evictions": self.evictions}
+
+
+class DatabaseRateLimitBackend(RateLimitBackend):
+    # Wall-clock timestamps, so every worker sees the same buckets. Rows are locked while they are updated.
+    def __init__(self, session_factory: async_sessionmaker, idle_seconds: float, prune_every: int):
+        self.session_factory = session_factory
+        self.idle_seconds = idle_seconds
+        self.prune_every = prune_every
+        self._hits_since_prune = 0
+
+    async def hit(self, keys: list[tuple[str, LimitRule]]) -> tuple[float, str | None]:
+        # Lock/read, then at most one UPDATE and one INSERT.
+        extend_query_budget(3)
+        now = time.time()
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(LoginThrottle).where(LoginThrottle.id.in_([key for key, _ in keys])).with_for_update()
+            )
+            rows = {row.id: row for row in result.scalars()}
+            for key, rule in keys:
+                row = rows.get(key)
+                state = BucketState(row.tokens, row.refilled_at, row.window_started_at, row.window_count,
+                                    row.previous_count) if row else None
+                state, wait = admit(state, rule, now)
+                if wait:
+                    return wait, key
+                if row is None:
+                    row = LoginThrottle(id=key)
+                    session.add(row)
+                for name in BucketState.__slots__:
+                    setattr(row, name, getattr(state, name))
+            try:
+                await session.commit()
+            except IntegrityError:
+                # Another worker created the same key at the same moment; this attempt goes uncounted.
+                await session.rollback()
+        self._hits_since_prune += 1
+        if self._hits_since_prune >= self.prune_every:
+            self._hits_since_prune = 0
+            await self.prune(now)
+        return 0.0, None
+
+    async def reset(self, key: str) -> None:
+        extend_query_budget(1)
+        async with self.session_factory() as session:
+            await session.execute(delete(LoginThrottle).where(LoginThrottle.id == key))
+            await session.commit()
+
+    async def prune(self, now: float) -> None:
+        extend_query_budget(1)
+        async with self.session_factory() as session:
+            await session.execute(delete(LoginThrottle).where(LoginThrottle.refilled_at < now - self.idle_seconds))
+            await session.commit()
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else ""
+
+
+def account_key(account: str) -> str:
+    # Hashed so that the key fits LoginThrottle.id whatever the client sends as a username.
+    return f"account:{hashlib.sha256(account.strip().lower().encode()).hexdigest()}"
+
+
+class LoginLimiter:
+    def __init__(self, backend: RateLimitBackend, ip_rule: LimitRule, account_rule: LimitRule,
+                 enabled: bool = True):
+        self.backend = backend
+        self.ip_rule = ip_rule
+        self.account_rule = account_rule
+        self.enabled = enabled
+
+    async def check(self, ip: str, account: str) -> float:
+        # Seconds the client has to wait, 0 when the attempt may go on to the password check.
+        if not self.enabled:
+            return 0.0
+        wait, key = await self.backend.hit([(f"ip:{ip}", self.ip_rule),
+                                            (account_key(account), self.account_rule)])
+        login_attempts.inc(f"throttled_{key.partition(':')[0]}" if key else "allowed")
+        return wait
+
+    async def succeeded(self, account: str) -> None:
+        # A correct password clears the account's failures; the IP bucket keeps counting.
+        if self.enabled:
+            await self.backend.reset(account_key(account))
+
+
+def build_login_limiter() -> LoginLimiter:
+    ip_rule = LimitRule(burst=settings.login_ip_burst, per_second=settings.login_ip_per_second,
+                        window_seconds=settings.login_ip_window_seconds, window_limit=settings.login_ip_window_limit)
+    account_rule = LimitRule(burst=settings.login_account_burst, per_second=settings.login_account_per_second,
+                             window_seconds=settings.login_account_window_seconds,
+                             window_limit=settings.login_account_window_limit)
+    if settings.login_rate_limit_backend == "database":
+        backend = DatabaseRateLimitBackend(session_factory=db_helper.session_factory,
+                                           idle_seconds=max(ip_rule.idle_seconds, account_rule.idle_seconds),
+                                           prune_every=settings.login_rate_limit_prune_every)
+    else:
+        backend = InMemoryRateLimitBackend(max_keys=settings.login_rate_limit_max_keys)
+    return LoginLimiter(backend, ip_rule, account_rule, enabled=settings.login_rate_limit_enabled)
+
+
+login_limiter = build_login_limiter()
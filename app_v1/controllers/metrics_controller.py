@@ -0,0 +1,51 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app_v1.auth.service.jwt_service import password_hash_stats, token_cache
+from app_v1.auth.service.rate_limit import login_limiter
+from app_v1.core import db_helper
+from app_v1.core.cache import caches
+from app_v1.core.metrics import registry, stats_gauges
+from app_v1.core.query_budget import query_budget
+from app_v1.core.shared_cache import invalidation_bus
+from app_v1.jobs import improvement_cache
+
+router = APIRouter(tags=['metrics'])
+
+
+def collect_pool():
+    metrics = db_helper.pool_metrics()
+    replicas = metrics.pop("replicas")
+    yield from stats_gauges("db_pool", "Primary connection pool state.", metrics)
+    yield from stats_gauges("db_replica_pool", "Replica connection pool state.",
+                            {(index,): replica for index, replica in enumerate(replicas)}, ("replica",))
+
+
+def collect_password_hash():
+    yield from stats_gauges("password_hash_pool", "bcrypt thread pool state.", password_hash_stats.snapshot())
+
+
+def collect_caches():
+    for name, cache in (*caches.items(), ("token", token_cache)):
+        yield from stats_gauges(f"cache_{name}", f"{name} cache state.", cache.stats())
+    yield from stats_gauges("cache_invalidation_bus", "Cross-worker cache invalidation state.",
+                            invalidation_bus.stats())
+    stats = improvement_cache.stats()
+    yield from stats_gauges("cache_improvement_lru", "Improvement cache memory tier state.", stats.pop("memory"))
+    yield from stats_gauges("cache_improvement", "Improvement cache state.", stats)
+
+
+def collect_login_limiter():
+    yield from stats_gauges("login_rate_limit", "Login rate limiter state.", login_limiter.backend.stats())
+
+
+registry.add_collector(collect_pool)
+registry.add_collector(collect_password_hash)
+registry.add_collector(collect_caches)
+registry.add_collector(collect_login_limiter)
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+@query_budget(0)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
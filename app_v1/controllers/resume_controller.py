@@ -1,29 +1,171 @@
-from typing import Annotated
+import logging
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, Path, HTTPException
+from fastapi import APIRouter, Depends, Path, HTTPException, Query, Header, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
 from starlette import status
 
-from app_v1.auth.service.jwt_service import get_current_user
-from app_v1.models import User
-from app_v1.core import db_helper
+from app_v1.auth.service.jwt_service import get_current_user, get_current_admin
+from app_v1.schemas.user import User
+from app_v1.core import db_helper, settings
+from app_v1.core.imports import RecordTooLarge, ndjson_records, csv_records
+from app_v1.core.metrics import resume_import_rows
+from app_v1.core.export import EXPORT_MEDIA_TYPES, ndjson_chunks, csv_chunks, zip_chunks
+from app_v1.core.conditional import resume_etag, collection_etag, etag_matches, if_match_versions, http_date
+from app_v1.core.pagination import encode_cursor, decode_cursor
+from app_v1.core.query_budget import query_budget, extend_query_budget
+from app_v1.core.responses import render
+from app_v1.jobs import improvement_queue, request_improvement
 from app_v1.repositories import resume_repository
-from app_v1.schemas.resume import ResumeRead, ResumeCreate, ResumeUpdate, ResumeUpdatePartial
+from app_v1.schemas.improvement_job import ImprovementJobRead
+from app_v1.schemas.resume import (ResumeRead, ResumeCreate, ResumeUpdate, ResumeUpdatePartial, ResumePage,
+                                   ResumeBatch, ResumeBatchResult, ResumeSearchHit, ResumeImportReport,
+                                   ResumeImportError)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=['resumes'])
 
 
-@router.get('/', response_model=list[ResumeRead],
-            summary="Получить список всех резюме из базы данных",
-            description="Эндпоинт для получения списка всех резюме из базы данных.")
-async def read_resumes(session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+def parse_fields(fields: str | None) -> list[str] | None:
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in resume_repository.RESUME_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+def expected_versions(resume_id: int, if_match: str | None) -> list[tuple[str, int]] | None:
+    if if_match is None or if_match.strip() == "*":
+        return None
+    return if_match_versions(if_match, resume_id)
+
+
+async def raise_write_failure(session: AsyncSession, resume_id: int, owner_id: int,
+                              versions: list[tuple[str, int]] | None):
+    if versions is not None and await resume_repository.resume_exists(session, resume_id, owner_id):
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Resume was modified")
+    raise HTTPException(status_code=404, detail="Resume not found")
+
+
+async def export_rows(owner_id: int | None, format: str):
+    # Own session: the request's session is closed before a StreamingResponse body is sent.
+    async with db_helper.read_session() as session:
+        batches = resume_repository.stream_resume_rows(session, owner_id=owner_id,
+                                                       batch_size=settings.export_batch_size)
+        if format == "ndjson":
+            chunks = ndjson_chunks(batches)
+        else:
+            chunks = csv_chunks(batches, resume_repository.RESUME_FIELDS)
+            if format == "zip":
+                chunks = zip_chunks("resumes.csv", chunks)
+        async for chunk in chunks:
+            yield chunk
+
+
+def export_response(owner_id: int | None, format: str, filename: str) -> StreamingResponse:
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{format}"'}
+    if format == "zip":
+        # Already deflated; keeps CompressionMiddleware from compressing it a second time.
+        headers["Content-Encoding"] = "identity"
+    return StreamingResponse(export_rows(owner_id, format), media_type=EXPORT_MEDIA_TYPES[format], headers=headers)
+
+
+def validation_detail(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}" for error in exc.errors())
+
+
+def resume_headers(resume) -> dict:
+    return {
+        "ETag": resume_etag(resume.id, resume.incarnation, resume.version),
+        "Last-Modified": http_date(resume.updated_at),
+        "Cache-Control": "private, no-cache",
+    }
+
+
+@router.get('/', response_model=ResumePage, response_model_exclude_unset=True,
+            summary="Получить список резюме постранично",
+            description="Эндпоинт для получения списка резюме пользователя с курсорной пагинацией. "
+                        "Для следующей страницы передайте next_cursor в параметре cursor. "
+                        "Параметр fields (через запятую) ограничивает набор возвращаемых полей. "
+                        "Поддерживается условный запрос через If-None-Match.")
+@query_budget(3)
+async def read_resumes(request: Request, response: Response,
+                       limit: int = Query(settings.page_size_default, ge=1, le=settings.page_size_max),
+                       cursor: str | None = Query(None),
+                       order: Literal["asc", "desc"] = Query("asc"),
+                       fields: str | None = Query(None, description="Например: id,title"),
+                       if_none_match: str | None = Header(None),
+                       session: AsyncSession = Depends(db_helper.scoped_session_dependency),
                        current_user: User = Depends(get_current_user)):
-    return await resume_repository.get_resumes(session=session, owner_id=current_user.id)
+    after_id, descending = None, order == "desc"
+    if cursor:
+        try:
+            after_id, descending = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    collection_version = await resume_repository.get_collection_version(session, current_user.id)
+    headers = {
+        "ETag": collection_etag(current_user.id, collection_version, request.url.query),
+        "Cache-Control": "private, no-cache",
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    items, next_id = await resume_repository.get_resumes(
+        session=session,
+        owner_id=current_user.id,
+        limit=limit,
+        after_id=after_id,
+        descending=descending,
+        fields=parse_fields(fields),
+    )
+    next_cursor = encode_cursor(next_id, descending) if next_id is not None else None
+    return render(response, ResumePage, {"items": items, "next_cursor": next_cursor}, headers=headers,
+                  exclude_unset=True)
+
+
+@router.get('/search', response_model=list[ResumeSearchHit],
+            summary="Полнотекстовый поиск по резюме",
+            description="Эндпоинт для поиска резюме пользователя по заголовку и описанию. "
+                        "Результаты отсортированы по релевантности.")
+@query_budget(2)
+async def search_resumes(response: Response, q: str = Query(..., min_length=1, max_length=200),
+                         limit: int = Query(settings.page_size_default, ge=1, le=settings.page_size_max),
+                         session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+                         current_user: User = Depends(get_current_user)):
+    hits = await resume_repository.search_resumes(session=session, owner_id=current_user.id, query=q, limit=limit)
+    return render(response, list[ResumeSearchHit], hits)
+
+
+@router.get('/export', response_class=StreamingResponse,
+            summary="Выгрузить все резюме пользователя",
+            description="Эндпоинт для потоковой выгрузки всех резюме пользователя в формате ndjson, csv или zip "
+                        "(csv внутри архива). Строки читаются из базы порциями и не накапливаются в памяти.")
+@query_budget(2)
+async def export_resumes(format: Literal["ndjson", "csv", "zip"] = Query("ndjson"),
+                         current_user: User = Depends(get_current_user)):
+    return export_response(current_user.id, format, "resumes")
+
+
+@router.get('/export/all', response_class=StreamingResponse,
+            summary="Выгрузить резюме всех пользователей",
+            description="Эндпоинт для администраторов: потоковая выгрузка резюме всех пользователей "
+                        "в формате ndjson, csv или zip.")
+@query_budget(2)
+async def export_all_resumes(format: Literal["ndjson", "csv", "zip"] = Query("ndjson"),
+                             current_user: User = Depends(get_current_admin)):
+    return export_response(None, format, "resumes_all")
 
 
 @router.post('/', response_model=ResumeRead, status_code=status.HTTP_201_CREATED,
              summary="Создать новое резюме",
              description="Эндпоинт для создания нового резюме. ")
+@query_budget(2)
 async def create_resume(
         resume_in: ResumeCreate,
         session: AsyncSession = Depends(db_helper.scoped_session_dependency),
@@ -36,6 +178,27 @@ async def create_resume(
     )
 
 
+@router.post('/batch', response_model=ResumeBatchResult,
+             summary="Пакетное создание, обновление и удаление резюме",
+             description="Эндпоинт для создания, частичного обновления и удаления нескольких резюме "
+                         "в одной транзакции. Возвращает результат для каждого элемента.")
+@query_budget(4)
+async def batch_resumes(batch: ResumeBatch,
+                        session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+                        current_user: User = Depends(get_current_user)):
+    if len(batch.create) + len(batch.update) + len(batch.delete) > settings.batch_max_items:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Batch is limited to {settings.batch_max_items} items")
+    results = await resume_repository.apply_resume_batch(
+        session=session,
+        owner_id=current_user.id,
+        creates=batch.create,
+        updates=batch.update,
+        delete_ids=batch.delete,
+    )
+    return {"results": results}
+
+
 async def get_resume_by_id(resume_id: int, session: AsyncSession = Depends(db_helper.scoped_session_dependency),
                            current_user: User = Depends(get_current_user)):
     resume = await resume_repository.get_resume_by_id(session, resume_id)
@@ -44,63 +207,140 @@ async def get_resume_by_id(resume_id: int, session: AsyncSession = Depends(db_he
     return resume
 
 
+@router.post('/import', response_model=ResumeImportReport,
+             summary="Импортировать резюме из файла",
+             description="Эндпоинт для загрузки большого количества резюме. Тело запроса - файл в формате "
+                         "ndjson или csv (с заголовком title,description); формат берется из параметра format "
+                         "или из Content-Type. Файл читается потоком, строки проверяются и записываются "
+                         "порциями, каждая порция - отдельная транзакция. Строки с ошибками пропускаются "
+                         "и перечисляются в отчете.")
+@query_budget(2)
+async def import_resumes(request: Request,
+                         format: Literal["ndjson", "csv"] | None = Query(None),
+                         session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+                         current_user: User = Depends(get_current_user)):
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    parse = csv_records if format == "csv" else ndjson_records
+    report = ResumeImportReport(imported=0, failed=0, batches=0, errors=[])
+    chunk: list[ResumeCreate] = []
+
+    async def flush():
+        if report.batches:
+            extend_query_budget(1)
+        report.imported += await resume_repository.import_resumes(session, current_user.id, chunk)
+        report.batches += 1
+        resume_import_rows.inc("imported", amount=len(chunk))
+        logger.info("Import for user %s: %d rows imported, %d failed", current_user.id, report.imported,
+                    report.failed)
+        chunk.clear()
+
+    try:
+        async for row, record in parse(request.stream(), settings.import_max_record_bytes):
+            try:
+                if isinstance(record, bytes):
+                    chunk.append(ResumeCreate.model_validate_json(record))
+                else:
+                    chunk.append(ResumeCreate.model_validate(record))
+            except ValidationError as exc:
+                report.failed += 1
+                resume_import_rows.inc("failed")
+                if len(report.errors) < settings.import_max_errors:
+                    report.errors.append(ResumeImportError(row=row, detail=validation_detail(exc)))
+                continue
+            if len(chunk) >= settings.import_batch_size:
+                await flush()
+    except RecordTooLarge as exc:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"{exc}; {report.imported} rows were imported before it")
+    if chunk:
+        await flush()
+    return report
+
+
 @router.get('/{resume_id}', response_model=ResumeRead,
             summary="Получить информацию о конкретном резюме по его ID.",
             description="Эндпоинт для получения информации о существующем резюме из базы данных. "
-                        "Необходимо ввести ID резюме.")
-async def get_resume(resume: ResumeRead = Depends(get_resume_by_id)):
-    return resume
+                        "Необходимо ввести ID резюме. Поддерживается условный запрос через If-None-Match.")
+@query_budget(2)
+async def get_resume(response: Response, resume: ResumeRead = Depends(get_resume_by_id),
+                     if_none_match: str | None = Header(None)):
+    headers = resume_headers(resume)
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return render(response, ResumeRead, resume, headers=headers)
 
 
 @router.put('/{resume_id}', response_model=ResumeRead,
             summary="Обновить всю информацию в резюме",
-            description="Эндпоинт для обновления всей информации в резюме, существующего в базе данных. ")
-async def update_resume(resume_id: int, resume_update: ResumeUpdate,
+            description="Эндпоинт для обновления всей информации в резюме, существующего в базе данных. "
+                        "С заголовком If-Match обновление выполняется, только если резюме не менялось.")
+@query_budget(3)
+async def update_resume(resume_id: int, resume_update: ResumeUpdate, response: Response,
+                        if_match: str | None = Header(None),
                         session: AsyncSession = Depends(db_helper.scoped_session_dependency),
                         current_user: User = Depends(get_current_user)):
-    resume = await resume_repository.get_resume_by_id(session, resume_id)
-    if not resume or resume.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Resume not found")
-    return await resume_repository.update_resume(session, resume, resume_update, partial=False)
+    versions = expected_versions(resume_id, if_match)
+    resume = await resume_repository.update_resume(session, resume_id, current_user.id, resume_update, partial=False,
+                                                   expected_versions=versions)
+    if not resume:
+        await raise_write_failure(session, resume_id, current_user.id, versions)
+    response.headers.update(resume_headers(resume))
+    return resume
 
 
 @router.patch("/{resume_id}", response_model=ResumeRead,
               summary="Обновить информацию в резюме частично",
-              description="Эндпоинт для обновления некоторой информации в резюме, существующего в базе данных. ")
-async def partial_update_resume(resume_id: int, resume_update: ResumeUpdatePartial,
+              description="Эндпоинт для обновления некоторой информации в резюме, существующего в базе данных. "
+                          "С заголовком If-Match обновление выполняется, только если резюме не менялось.")
+@query_budget(3)
+async def partial_update_resume(resume_id: int, resume_update: ResumeUpdatePartial, response: Response,
+                                if_match: str | None = Header(None),
                                 session: AsyncSession = Depends(db_helper.scoped_session_dependency),
                                 current_user: User = Depends(get_current_user)):
-    resume = await resume_repository.get_resume_by_id(session, resume_id)
-    if not resume or resume.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Resume not found")
-    return await resume_repository.update_resume(session, resume, resume_update, partial=True)
+    versions = expected_versions(resume_id, if_match)
+    resume = await resume_repository.update_resume(session, resume_id, current_user.id, resume_update, partial=True,
+                                                   expected_versions=versions)
+    if not resume:
+        await raise_write_failure(session, resume_id, current_user.id, versions)
+    response.headers.update(resume_headers(resume))
+    return resume
 
 
 @router.delete("/{resume_id}", status_code=status.HTTP_204_NO_CONTENT,
                summary="Удалить резюме",
                description="Эндпоинт для удаления резюме, существующего в базы данных. "
-                           "Необходимо ввести ID резюме, которое нужно удалить.")
-async def delete_resume(resume_id: int, session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+                           "Необходимо ввести ID резюме, которое нужно удалить. "
+                           "С заголовком If-Match удаление выполняется, только если резюме не менялось.")
+@query_budget(3)
+async def delete_resume(resume_id: int, if_match: str | None = Header(None),
+                        session: AsyncSession = Depends(db_helper.scoped_session_dependency),
                         current_user: User = Depends(get_current_user)):
-    resume = await resume_repository.get_resume_by_id(session, resume_id)
-    if not resume or resume.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Resume not found")
-    await resume_repository.delete_resume(session, resume)
+    versions = expected_versions(resume_id, if_match)
+    if not await resume_repository.delete_resume(session, resume_id, current_user.id, expected_versions=versions):
+        await raise_write_failure(session, resume_id, current_user.id, versions)
     return None
 
 
-@router.post("/resume/{resume_id}/improve",
+@router.post("/resume/{resume_id}/improve", response_model=ImprovementJobRead, status_code=status.HTTP_202_ACCEPTED,
              summary="Интеграция с AI",
              description="(Тестовая версия. Заглушка.) Эндпоинт для улучшения резюме, существующего в базы данных. "
-                         "Необходимо ввести ID резюме, которое нужно улучшить.")
+                         "Необходимо ввести ID резюме, которое нужно улучшить. Улучшение выполняется в фоне: "
+                         "эндпоинт возвращает задачу, статус которой доступен по /resumes/jobs/{job_id}.")
+@query_budget(3)
 async def improve_resume(
-    resume_id: int,
-    session: AsyncSession = Depends(db_helper.scoped_session_dependency),
-    current_user: User = Depends(get_current_user)
+    resume: ResumeRead = Depends(get_resume_by_id),
+    session: AsyncSession = Depends(db_helper.scoped_session_dependency)
 ):
-    resume = await resume_repository.get_resume_by_id(session, resume_id)
-    if not resume or resume.owner_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Resume not found")
+    return await request_improvement(session, resume)
+
 
-    updated_resume = await resume_repository.improve_resume(session, resume)
-    return updated_resume
+@router.get("/jobs/{job_id}", response_model=ImprovementJobRead,
+            summary="Получить статус задачи улучшения резюме",
+            description="Эндпоинт для получения статуса и результата задачи улучшения резюме.")
+@query_budget(1)
+async def get_improvement_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = await improvement_queue.get(job_id)
+    if not job or job.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,30 +1,61 @@
-from typing import Annotated
+from typing import Annotated, AsyncIterator, Literal
 
-from fastapi import APIRouter, Depends, Path, HTTPException
+from fastapi import APIRouter, Depends, Path, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from app_v1.schemas.user import User
-from app_v1.core import db_helper
+from app_v1.core import db_helper, settings
+from app_v1.core.pagination import encode_cursor, decode_cursor
+from app_v1.core.responses import render
+from app_v1.core.query_budget import query_budget
 from app_v1.repositories import user_repository
-from app_v1.schemas.user import UserRead, UserCreate, UserUpdate, UserUpdatePartial
+from app_v1.schemas.user import UserRead, UserCreate, UserUpdate, UserUpdatePartial, UserPage
 
 router = APIRouter(tags=['users'])
 
 
-@router.get('/', response_model=list[User], summary="Получить список всех пользователей",
-            description="Эндпоинт для получения списка всех пользователей из базы данных.")
-async def get_users(session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
-    return await user_repository.get_users(session=session)
+async def stream_users_ndjson() -> AsyncIterator[bytes]:
+    async with db_helper.read_session() as session:
+        async for user in user_repository.stream_users(session=session, batch_size=settings.stream_batch_size):
+            yield User.model_validate(user).model_dump_json().encode() + b"\n"
+
+
+@router.get('/', response_model=UserPage, summary="Получить список пользователей",
+            description="Эндпоинт для получения списка пользователей из базы данных с курсорной пагинацией. "
+                        "Для следующей страницы передайте next_cursor в параметре cursor. "
+                        "С параметром format=ndjson все пользователи отдаются потоком, по одному JSON-объекту "
+                        "на строку.")
+@query_budget(1)
+async def get_users(response: Response, limit: int = Query(settings.page_size_default, ge=1, le=settings.page_size_max),
+                    cursor: str | None = Query(None),
+                    format: Literal["json", "ndjson"] = Query("json"),
+                    session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
+    if format == "ndjson":
+        return StreamingResponse(stream_users_ndjson(), media_type="application/x-ndjson")
+    after_id = None
+    if cursor:
+        try:
+            after_id, _ = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    users, next_id = await user_repository.get_users(session=session, limit=limit, after_id=after_id)
+    return render(response, UserPage,
+                  {"items": users, "next_cursor": encode_cursor(next_id) if next_id is not None else None})
 
 
 @router.post('/', response_model=UserRead, status_code=status.HTTP_201_CREATED,
              summary="Создать нового пользователя",
              description="Эндпоинт для создания нового пользователя. "
                          "Необходимо ввести имя, почту и пароль.")
+@query_budget(1)
 async def create_user(user_in: UserCreate,
                       session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
-    return await user_repository.create_user(session=session, user_in=user_in)
+    try:
+        return await user_repository.create_user(session=session, user_in=user_in)
+    except user_repository.EmailAlreadyRegistered:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
 
 
 async def get_user_by_id(user_id: Annotated[int, Path],
@@ -39,6 +70,7 @@ async def get_user_by_id(user_id: Annotated[int, Path],
             summary="Получить информацию о конкретном пользователе по его ID.",
             description="Эндпоинт для получения информации о существующем пользователе из базы данных. "
                         "Необходимо ввести ID пользователя.")
+@query_budget(1)
 async def get_user(user: User = Depends(get_user_by_id)):
     return user
 
@@ -47,26 +79,35 @@ async def get_user(user: User = Depends(get_user_by_id)):
             summary="Обновить все данные о пользователе",
             description="Эндпоинт для обновления всей информации пользователя, существующего в базе данных. "
                         "Необходимо ввести все поля: имя, почту и пароль.")
+@query_budget(3)
 async def update_user(user_update: UserUpdate,
                       user: User = Depends(get_user_by_id),
                       session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
-    return await user_repository.update_user(session=session, user=user, user_update=user_update)
+    try:
+        return await user_repository.update_user(session=session, user=user, user_update=user_update)
+    except user_repository.EmailAlreadyRegistered:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
 
 
 @router.patch("/{user_id}", response_model=User,
             summary="Обновить данные о пользователе частично",
             description="Эндпоинт для обновления некоторой информации пользователя, существующего в базе данных. "
                         "Необходимо ввести те поля, которые нужно обновить: имя, почта или пароль.")
+@query_budget(3)
 async def update_user_partial(user_update: UserUpdatePartial,
                               user: User = Depends(get_user_by_id),
                               session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
-    return await user_repository.update_user(session=session, user=user, user_update=user_update, partial=True)
+    try:
+        return await user_repository.update_user(session=session, user=user, user_update=user_update, partial=True)
+    except user_repository.EmailAlreadyRegistered:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
 
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT,
             summary="Удалить пользователя",
             description="Эндпоинт для удаления пользователя, существующего в базы данных. "
                         "Необходимо ввести ID пользователя, которого нужно удалить.")
+@query_budget(4)
 async def delete_user(user: User = Depends(get_user_by_id),
                       session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
     return await user_repository.delete_user(session=session, user=user)
@@ -1,54 +1,82 @@
 from fastapi import APIRouter, Request, Form, Depends, Response, HTTPException
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, HTMLResponse
+from markupsafe import Markup
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.status import HTTP_303_SEE_OTHER
-from fastapi.templating import Jinja2Templates
 
-from app_v1.core import db_helper
-from app_v1.auth.service.jwt_service import create_access_token, decode_jwt_token, verify_password, get_password_hash
+from app_v1.core import db_helper, settings
+from app_v1.core.cache import resume_fragment_cache
+from app_v1.core.pagination import encode_cursor, decode_cursor
+from app_v1.core.templates import templates
+from app_v1.core.query_budget import query_budget, extend_query_budget
+from app_v1.auth.service.cookie_refresh import set_auth_cookies, clear_auth_cookies
+from app_v1.auth.service.jwt_service import (decode_jwt_token, verify_and_update_password_async, get_user_by_subject,
+                                             issue_tokens, revoke_refresh_token)
+from app_v1.auth.service.rate_limit import login_limiter, client_ip
+from app_v1.jobs import improvement_queue, request_improvement
 from app_v1.models.user import User
+from app_v1.schemas.improvement_job import ImprovementJobRead
 from app_v1.schemas.resume import ResumeCreate, ResumeUpdate, ResumeUpdatePartial
 from app_v1.repositories import resume_repository, user_repository
 from app_v1.schemas.user import UserCreate
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/login")
+@query_budget(0)
 async def login_page(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 
 @router.get("/register")
+@query_budget(0)
 async def register_page(request: Request):
     return templates.TemplateResponse("register.html", {"request": request})
 
 
 @router.post("/login")
+@query_budget(3)
 async def login_submit(
+        request: Request,
         email: str = Form(...),
         password: str = Form(...),
         session: AsyncSession = Depends(db_helper.scoped_session_dependency)
 ):
+    if await login_limiter.check(client_ip(request), email):
+        return RedirectResponse("/login?msg=Слишком много попыток входа, попробуйте позже",
+                                status_code=HTTP_303_SEE_OTHER)
     db_user = await user_repository.get_user_by_email(session, email)
-    if not db_user or not verify_password(password, db_user.password):
+    if not db_user:
+        return RedirectResponse("/login?msg=Неверные данные", status_code=HTTP_303_SEE_OTHER)
+    valid, new_hash = await verify_and_update_password_async(password, db_user.password)
+    if not valid:
         return RedirectResponse("/login?msg=Неверные данные", status_code=HTTP_303_SEE_OTHER)
-    token = create_access_token({"sub": db_user.email})
+    if new_hash:
+        await user_repository.update_password_hash(session, db_user, new_hash)
+    await login_limiter.succeeded(email)
     response = RedirectResponse("/index", status_code=HTTP_303_SEE_OTHER)
-    response.set_cookie(key="access_token", value=token, httponly=True)
+    set_auth_cookies(response, await issue_tokens(session, db_user.email, db_user.id))
     return response
 
 
 @router.post("/logout")
-async def logout():
+@query_budget(1)
+async def logout(request: Request, session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
+    refresh_token = request.cookies.get("refresh_token")
+    if refresh_token:
+        try:
+            await revoke_refresh_token(session, refresh_token)
+        except HTTPException:
+            pass
     response = RedirectResponse("/login", status_code=HTTP_303_SEE_OTHER)
-    response.delete_cookie("access_token")
+    clear_auth_cookies(response)
     return response
 
 
 @router.post("/register")
+@query_budget(2)
 async def register_user(
         name: str = Form(...),
         email: str = Form(...),
@@ -58,7 +86,10 @@ async def register_user(
     exists = await user_repository.get_user_by_email(session, email)
     if exists:
         return RedirectResponse("/register?msg=Email уже зарегистрирован", status_code=HTTP_303_SEE_OTHER)
-    await user_repository.create_user(session, UserCreate(name=name, email=email, password=password))
+    try:
+        await user_repository.create_user(session, UserCreate(name=name, email=email, password=password))
+    except user_repository.EmailAlreadyRegistered:
+        return RedirectResponse("/register?msg=Email уже зарегистрирован", status_code=HTTP_303_SEE_OTHER)
     return RedirectResponse("/login?msg=Регистрация успешна! Теперь войдите", status_code=HTTP_303_SEE_OTHER)
 
 
@@ -68,91 +99,169 @@ async def get_current_user_from_cookie(request: Request, session: AsyncSession):
         return None
     payload = decode_jwt_token(token)
     email = payload.get("sub")
-    if not email:
+    if not email or payload.get("type") == "refresh":
         return None
-    result = await session.execute(select(User).where(User.email == email))
-    user = result.scalars().first()
-    return user
+    return await get_user_by_subject(session, email)
+
+
+def wants_fragment(request: Request) -> bool:
+    return request.headers.get("X-Fragment") == "1"
+
+
+def render_card(resume, job: ImprovementJobRead | None = None) -> str:
+    # A card with an unfinished improvement job polls its fragment URL until the job is over.
+    if job is not None and job.status not in ("queued", "running"):
+        job = None
+    return templates.get_template("fragments/resume_card.html").render(resume=resume, job=job)
+
+
+async def render_resume_list(session: AsyncSession, owner_id: int, cursor: str | None) -> Markup:
+    html, token = await resume_fragment_cache.get(owner_id, ("list", cursor))
+    if html is None:
+        after_id = decode_cursor(cursor)[0] if cursor else None
+        resumes, next_id = await resume_repository.get_resumes(
+            session, owner_id=owner_id, limit=settings.page_size_default, after_id=after_id
+        )
+        next_cursor = encode_cursor(next_id) if next_id is not None else None
+        html = templates.get_template("fragments/resume_list.html").render(
+            resumes=resumes, cursor=cursor, next_cursor=next_cursor
+        )
+        await resume_fragment_cache.set(owner_id, ("list", cursor), html, token)
+    return Markup(html)
+
+
+def web_result(request: Request, fragment: str = "") -> Response:
+    if wants_fragment(request):
+        return HTMLResponse(fragment)
+    return RedirectResponse("/index", status_code=HTTP_303_SEE_OTHER)
 
 
 @router.get("/index")
-async def index(request: Request, session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
+@query_budget(2)
+async def index(request: Request, cursor: str | None = None,
+                session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
     user = await get_current_user_from_cookie(request, session)
     if not user:
         return RedirectResponse("/login", status_code=HTTP_303_SEE_OTHER)
-    resumes = await resume_repository.get_resumes(session, owner_id=user.id)
-    return templates.TemplateResponse("index.html", {"request": request, "user": user, "resumes": resumes})
+    try:
+        resume_list = await render_resume_list(session, user.id, cursor)
+    except ValueError:
+        return RedirectResponse("/index", status_code=HTTP_303_SEE_OTHER)
+    return templates.TemplateResponse("index.html", {"request": request, "user": user, "resume_list": resume_list})
+
+
+@router.get("/fragments/resumes")
+@query_budget(2)
+async def resume_list_fragment(request: Request, cursor: str | None = None,
+                               session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
+    user = await get_current_user_from_cookie(request, session)
+    if not user:
+        return RedirectResponse("/login", status_code=HTTP_303_SEE_OTHER)
+    try:
+        return HTMLResponse(await render_resume_list(session, user.id, cursor))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/fragments/resumes/{resume_id}")
+@query_budget(2)
+async def resume_card_fragment(resume_id: int, request: Request, job: str | None = None,
+                               session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
+    user = await get_current_user_from_cookie(request, session)
+    if not user:
+        return RedirectResponse("/login", status_code=HTTP_303_SEE_OTHER)
+    if job is not None:
+        extend_query_budget(1)
+        improvement = await improvement_queue.get(job)
+        if (improvement is not None and improvement.owner_id == user.id and improvement.resume_id == resume_id
+                and improvement.status in ("queued", "running")):
+            # Still running: rendered fresh and not cached, the finished card replaces it on a later poll.
+            resume = await resume_repository.get_resume_by_id(session, resume_id)
+            if not resume or resume.owner_id != user.id:
+                raise HTTPException(status_code=404, detail="Resume not found")
+            return HTMLResponse(render_card(resume, improvement))
+    html, token = await resume_fragment_cache.get(user.id, ("card", resume_id))
+    if html is None:
+        resume = await resume_repository.get_resume_by_id(session, resume_id)
+        if not resume or resume.owner_id != user.id:
+            raise HTTPException(status_code=404, detail="Resume not found")
+        html = render_card(resume)
+        await resume_fragment_cache.set(user.id, ("card", resume_id), html, token)
+    return HTMLResponse(html)
 
 
 @router.post("/create_resume")
+@query_budget(2)
 async def create_resume(
         request: Request,
-        title: str = Form(...),
-        description: str = Form(...),
+        title: str = Form(..., max_length=50),
+        description: str = Form(..., max_length=400),
         session: AsyncSession = Depends(db_helper.scoped_session_dependency)
 ):
     user = await get_current_user_from_cookie(request, session)
     if not user:
         return RedirectResponse("/login", status_code=HTTP_303_SEE_OTHER)
-    await resume_repository.create_resume(session, ResumeCreate(title=title, description=description), owner_id=user.id)
-    return RedirectResponse("/index", status_code=HTTP_303_SEE_OTHER)
+    resume = await resume_repository.create_resume(session, ResumeCreate(title=title, description=description),
+                                                   owner_id=user.id)
+    return web_result(request, render_card(resume) if wants_fragment(request) else "")
 
 
 @router.post("/delete_resume/{resume_id}")
+@query_budget(2)
 async def delete_resume(resume_id: int, request: Request,
                         session: AsyncSession = Depends(db_helper.scoped_session_dependency)):
     user = await get_current_user_from_cookie(request, session)
     if not user:
         return RedirectResponse("/login", status_code=HTTP_303_SEE_OTHER)
-    resume = await resume_repository.get_resume_by_id(session, resume_id)
-    if resume and resume.owner_id == user.id:
-        await resume_repository.delete_resume(session, resume)
-    return RedirectResponse("/index", status_code=HTTP_303_SEE_OTHER)
+    await resume_repository.delete_resume(session, resume_id, user.id)
+    return web_result(request)
 
 
 @router.post("/update_resume")
+@query_budget(2)
 async def update_resume(
         resume_id: int = Form(...),
-        title: str = Form(...),
-        description: str = Form(...),
+        title: str = Form(..., max_length=50),
+        description: str = Form(..., max_length=400),
         request: Request = None,
         session: AsyncSession = Depends(db_helper.scoped_session_dependency)
 ):
     user = await get_current_user_from_cookie(request, session)
     if not user:
         return RedirectResponse("/login", status_code=HTTP_303_SEE_OTHER)
-    resume = await resume_repository.get_resume_by_id(session, resume_id)
-    if resume and resume.owner_id == user.id:
-        await resume_repository.update_resume(session, resume, ResumeUpdate(title=title, description=description))
-    return RedirectResponse("/index", status_code=HTTP_303_SEE_OTHER)
+    resume = await resume_repository.update_resume(session, resume_id, user.id,
+                                                   ResumeUpdate(title=title, description=description))
+    if not resume and wants_fragment(request):
+        raise HTTPException(status_code=404, detail="Resume not found")
+    return web_result(request, render_card(resume) if wants_fragment(request) else "")
 
 
 @router.post("/update_resume_partial")
+@query_budget(2)
 async def update_resume_partial(
         resume_id: int = Form(...),
-        title: str | None = Form(None),
-        description: str | None = Form(None),
+        title: str | None = Form(None, max_length=50),
+        description: str | None = Form(None, max_length=400),
         request: Request = None,
         session: AsyncSession = Depends(db_helper.scoped_session_dependency)
 ):
     user = await get_current_user_from_cookie(request, session)
     if not user:
         return RedirectResponse("/login", status_code=HTTP_303_SEE_OTHER)
-    resume = await resume_repository.get_resume_by_id(session, resume_id)
-    if not resume or resume.owner_id != user.id:
-        raise HTTPException(status_code=404, detail="Resume not found")
     update_data = {
         "title": title if title and title.strip() else None,
         "description": description if description and description.strip() else None,
     }
     update_data = {k: v for k, v in update_data.items() if v is not None}
-    if update_data:
-        resume_update = ResumeUpdatePartial(**update_data)
-        await resume_repository.update_resume(session, resume, resume_update, partial=True)
-    return RedirectResponse("/index", status_code=HTTP_303_SEE_OTHER)
+    resume = await resume_repository.update_resume(session, resume_id, user.id, ResumeUpdatePartial(**update_data),
+                                                   partial=True)
+    if not resume:
+        raise HTTPException(status_code=404, detail="Resume not found")
+    return web_result(request, render_card(resume) if wants_fragment(request) else "")
 
 
 @router.post("/improve_resume")
+@query_budget(3)
 async def improve_resume_web(
         resume_id: int = Form(...),
         request: Request = None,
@@ -162,6 +271,13 @@ async def improve_resume_web(
     if not user:
         return RedirectResponse("/login", status_code=HTTP_303_SEE_OTHER)
     resume = await resume_repository.get_resume_by_id(session, resume_id)
-    if resume and resume.owner_id == user.id:
-        await resume_repository.improve_resume(session, resume)
-    return RedirectResponse("/index", status_code=HTTP_303_SEE_OTHER)
+    if not resume or resume.owner_id != user.id:
+        if wants_fragment(request):
+            raise HTTPException(status_code=404, detail="Resume not found")
+        return web_result(request)
+    job = await request_improvement(session, resume)
+    if not wants_fragment(request):
+        return web_result(request)
+    if job.status == "done":
+        resume.description = job.description
+    return web_result(request, render_card(resume, job))
@@ -0,0 +1,343 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from pydantic import BaseModel
+
+from .config import settings
+from .shared_cache import RedisLike, InvalidationBus, shared_store, invalidation_bus
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, *keys: Hashable) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+# Namespace -> cache, for per-namespace stats.
+caches: dict[str, "Cache | OwnerScopedCache"] = {}
+
+
+class Cache:
+    # Per-process LRU tier in front of an optional shared tier. Keys are JSON scalars so that invalidations can
+    # be broadcast to the other workers. The shared tier only ever holds JSON: plain values, or instances of
+    # `model` validated on the way back, so whatever is in the store is parsed as data and never executed.
+    #
+    # A load that overlaps an invalidation of its key must not be kept: the loader may have read the row before
+    # the write (or from a lagging replica). Locally the load is dropped if the key was invalidated after it
+    # started; in the shared tier every invalidation bumps the key's generation, and a load that finds the
+    # generation moved on deletes what it stored.
+    def __init__(self, namespace: str, maxsize: int, ttl: float, store: RedisLike | None = None,
+                 bus: InvalidationBus | None = None, lock_ms: int = 2000, model: type[BaseModel] | None = None):
+        self.namespace = namespace
+        self.model = model
+        self.ttl = ttl
+        self.store = store
+        self.bus = bus
+        self.lock_ms = lock_ms
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.shared_hits = 0
+        self.loads = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.remote_invalidations = 0
+        self.rejected_writes = 0
+        self._loading: dict[Hashable, asyncio.Future] = {}
+        # Key -> monotonic time of its last invalidation, local or broadcast.
+        self._invalidated = TTLCache(maxsize=maxsize, ttl=ttl)
+        caches[namespace] = self
+        if bus is not None:
+            bus.register(namespace, self.drop_local)
+
+    def _shared_key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _generation_key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key}:gen"
+
+    async def get(self, key: Hashable) -> Any:
+        value = self.local.get(key)
+        if value is not None or self.store is None:
+            return value
+        read_at = time.monotonic()
+        data = await self.store.get(self._shared_key(key))
+        if data is None:
+            return None
+        try:
+            value = self._loads(data)
+        except ValueError:
+            # Unreadable entry (another version's format, or not ours): treat it as a miss.
+            return None
+        self.shared_hits += 1
+        if self._invalidated.get(key, 0.0) < read_at:
+            self.local.set(key, value)
+        return value
+
+    async def set(self, key: Hashable, value: Any) -> None:
+        self.local.set(key, value)
+        if self.store is not None:
+            await self.store.set(self._shared_key(key), self._dumps(value), px=int(self.ttl * 1000))
+
+    def _dumps(self, value: Any) -> bytes:
+        return value.model_dump_json().encode() if self.model is not None else json.dumps(value).encode()
+
+    def _loads(self, data: bytes) -> Any:
+        return self.model.model_validate_json(data) if self.model is not None else json.loads(data)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        # Stampede protection: concurrent misses in this worker share one load, and across workers the
+        # shared lock lets one worker load while the others wait for its result.
+        value = await self.get(key)
+        if value is not None:
+            return value
+        loading = self._loading.get(key)
+        if loading is not None:
+            self.coalesced += 1
+            return await asyncio.shield(loading)
+        loading = self._loading[key] = asyncio.ensure_future(self._load(key, loader))
+        try:
+            return await asyncio.shield(loading)
+        finally:
+            if loading.done():
+                self._loading.pop(key, None)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            if self.store is None or await self.store.set(self._shared_key(key) + ":lock", b"1", px=self.lock_ms,
+                                                          nx=True):
+                return await self._load_and_store(key, loader)
+            deadline = time.monotonic() + self.lock_ms / 1000
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.02)
+                value = await self.get(key)
+                if value is not None:
+                    return value
+            return await self._load_and_store(key, loader)
+        finally:
+            self._loading.pop(key, None)
+
+    async def _load_and_store(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        self.loads += 1
+        try:
+            generation = await self.store.get(self._generation_key(key)) if self.store is not None else None
+            read_at = time.monotonic()
+            value = await loader()
+            if value is not None:
+                await self._set_unless_invalidated(key, value, read_at, generation)
+            return value
+        finally:
+            if self.store is not None:
+                await self.store.delete(self._shared_key(key) + ":lock")
+
+    async def _set_unless_invalidated(self, key: Hashable, value: Any, read_at: float,
+                                      generation: bytes | None) -> None:
+        if self._invalidated.get(key, 0.0) >= read_at:
+            self.rejected_writes += 1
+            return
+        await self.set(key, value)
+        # Checked after the write: an invalidation that bumped the generation before this read has to be undone
+        # here, one that bumps it later deletes the entry itself.
+        if self.store is not None and await self.store.get(self._generation_key(key)) != generation:
+            self.rejected_writes += 1
+            self.local.delete(key)
+            await self.store.delete(self._shared_key(key))
+
+    async def invalidate(self, *keys: Hashable) -> None:
+        if not keys:
+            return
+        self.invalidations += len(keys)
+        self._forget(keys)
+        if self.store is not None:
+            for key in keys:
+                name = self._generation_key(key)
+                await self.store.incr(name)
+                # Outlives any load that could still be running, so expiring it cannot let a stale one through.
+                await self.store.pexpire(name, int(2 * self.ttl * 1000))
+            await self.store.delete(*(self._shared_key(key) for key in keys))
+        if self.bus is not None:
+            await self.bus.publish(self.namespace, keys)
+
+    def _forget(self, keys) -> None:
+        self.local.delete(*keys)
+        now = time.monotonic()
+        for key in keys:
+            self._invalidated.set(key, now)
+
+    def drop_local(self, keys: list) -> None:
+        self._forget(keys)
+        self.remote_invalidations += len(keys)
+
+    def clear(self) -> None:
+        self.local.clear()
+        self._invalidated.clear()
+
+    def stats(self) -> dict:
+        return {**self.local.stats(), "misses": self.local.misses - self.shared_hits, "shared_hits": self.shared_hits,
+                "loads": self.loads, "coalesced": self.coalesced, "invalidations": self.invalidations,
+                "remote_invalidations": self.remote_invalidations, "rejected_writes": self.rejected_writes}
+
+
+class OwnerScopedCache:
+    # Groups entries per owner so that one write can drop everything rendered for that owner at once.
+    #
+    # In the shared tier every entry is its own key with its own TTL, under the owner's current generation.
+    # Invalidation bumps the generation, which orphans all older entries until they expire. A render started
+    # before an invalidation is written under the generation it read, so it can never be served afterwards.
+    # Each generation also counts its writes, which caps the keys per owner even for forged cursors.
+    def __init__(self, namespace: str, max_owners: int, max_entries_per_owner: int, ttl: float,
+                 store: RedisLike | None = None, bus: InvalidationBus | None = None):
+        self.namespace = namespace
+        self.max_entries_per_owner = max_entries_per_owner
+        self.ttl = ttl
+        self.store = store
+        self.bus = bus
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.remote_invalidations = 0
+        self.rejected_writes = 0
+        self._owners = TTLCache(maxsize=max_owners, ttl=ttl)
+        # Owner -> monotonic time of its last invalidation, so that a render that read before it is not kept.
+        self._invalidated = TTLCache(maxsize=max_owners, ttl=ttl)
+        caches[namespace] = self
+        if bus is not None:
+            bus.register(namespace, self.drop_local)
+
+    def _generation_key(self, owner_id: int) -> str:
+        return f"{self.namespace}:{owner_id}:gen"
+
+    def _entry_key(self, owner_id: int, generation: int, key: Hashable) -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+        return f"{self.namespace}:{owner_id}:{generation}:{digest}"
+
+    async def get(self, owner_id: int, key: Hashable) -> tuple[str | None, tuple[float, int]]:
+        # Returns the entry and a token to pass back to set() if the caller renders it instead.
+        read_at, generation = time.monotonic(), 0
+        entries = self._owners.get(owner_id)
+        value = entries.get(key) if entries is not None else None
+        if value is None and self.store is not None:
+            generation = int(await self.store.get(self._generation_key(owner_id)) or 0)
+            data = await self.store.get(self._entry_key(owner_id, generation, key))
+            if data is not None:
+                value = data.decode()
+                self.shared_hits += 1
+                self._remember(owner_id, key, value)
+                return value, (read_at, generation)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value, (read_at, generation)
+
+    def _remember(self, owner_id: int, key: Hashable, value: str) -> None:
+        entries = self._owners.get(owner_id)
+        if entries is None:
+            entries = {}
+            self._owners.set(owner_id, entries)
+        if len(entries) >= self.max_entries_per_owner and key not in entries:
+            entries.pop(next(iter(entries)))
+        entries[key] = value
+
+    async def set(self, owner_id: int, key: Hashable, value: str, token: tuple[float, int]) -> None:
+        read_at, generation = token
+        if self._invalidated.get(owner_id, 0.0) >= read_at:
+            self.rejected_writes += 1
+            return
+        self._remember(owner_id, key, value)
+        if self.store is None:
+            return
+        ttl_ms = int(self.ttl * 1000)
+        count_key = f"{self.namespace}:{owner_id}:{generation}:count"
+        count = await self.store.incr(count_key)
+        if count == 1:
+            await self.store.pexpire(count_key, ttl_ms)
+        if count > self.max_entries_per_owner:
+            self.rejected_writes += 1
+            return
+        await self.store.set(self._entry_key(owner_id, generation, key), value.encode(), px=ttl_ms)
+
+    async def invalidate(self, *owner_ids: int) -> None:
+        if not owner_ids:
+            return
+        self.invalidations += len(owner_ids)
+        self._forget(owner_ids)
+        if self.store is not None:
+            for owner_id in owner_ids:
+                name = self._generation_key(owner_id)
+                await self.store.incr(name)
+                # Outlives every entry written under an older generation, so expiring it cannot revive one.
+                await self.store.pexpire(name, int(2 * self.ttl * 1000))
+        if self.bus is not None:
+            await self.bus.publish(self.namespace, owner_ids)
+
+    def _forget(self, owner_ids) -> None:
+        self._owners.delete(*owner_ids)
+        now = time.monotonic()
+        for owner_id in owner_ids:
+            self._invalidated.set(owner_id, now)
+
+    def drop_local(self, owner_ids: list) -> None:
+        self._forget(owner_ids)
+        self.remote_invalidations += len(owner_ids)
+
+    def clear(self) -> None:
+        self._owners.clear()
+        self._invalidated.clear()
+
+    def stats(self) -> dict:
+        return {"owners": len(self._owners), "hits": self.hits, "shared_hits": self.shared_hits,
+                "misses": self.misses, "invalidations": self.invalidations,
+                "remote_invalidations": self.remote_invalidations, "rejected_writes": self.rejected_writes}
+
+
+resume_fragment_cache = OwnerScopedCache(
+    namespace="resume_fragment",
+    max_owners=settings.fragment_cache_max_owners,
+    max_entries_per_owner=settings.fragment_cache_max_entries_per_owner,
+    ttl=settings.fragment_cache_ttl_seconds,
+    store=shared_store,
+    bus=invalidation_bus,
+)
@@ -0,0 +1,35 @@
+import hashlib
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+_RESUME_ETAG = re.compile(r'(?:W/)?"r(\d+)\.([0-9a-f]*)-v(\d+)"')
+
+
+def resume_etag(resume_id: int, incarnation: str, version: int) -> str:
+    return f'"r{resume_id}.{incarnation}-v{version}"'
+
+
+def collection_etag(*parts) -> str:
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # Weak comparison, as required for If-None-Match.
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def if_match_versions(if_match: str, resume_id: int) -> list[tuple[str, int]]:
+    # (incarnation, version) pairs of the tags that name this resume.
+    return [(incarnation, int(version)) for etag_id, incarnation, version in _RESUME_ETAG.findall(if_match)
+            if int(etag_id) == resume_id]
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
@@ -1,4 +1,6 @@
 from pathlib import Path
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 BASE_DIR = Path(__file__).parent.parent.parent
@@ -7,12 +9,101 @@ BASE_DIR = Path(__file__).parent.parent.parent
 class Settings(BaseSettings):
     db_url: str
     db_echo: bool = False
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = False
+    db_statement_cache_size: int = 100
+    db_replica_urls: list[str] = []
+    db_read_your_writes_seconds: float = 5
+    db_replica_retry_seconds: float = 30
+    # create_all: create missing tables (local runs); check: fail unless the DB is at the alembic head; skip: no-op.
+    db_startup_schema: Literal["create_all", "check", "skip"] = "create_all"
+    db_pool_prewarm: int = 1
 
     jwt_private_key: str
     jwt_public_key: str
     jwt_algorithm: str = "RS256"
     jwt_access_token_expire_minutes: int = 60
+    # Lifetime of refresh tokens.
     jwt_response_token_expire_days: int = 7
+    # Requests racing with the same refresh token within this many seconds get the same new token pair.
+    jwt_refresh_grace_seconds: int = 30
+    # The web cookie flow refreshes the access token once it has less than this left.
+    jwt_cookie_refresh_seconds: int = 300
+    jwt_refresh_prune_every: int = 1000
+
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 64
+
+    # Login throttling, checked before the user lookup and bcrypt: a token bucket (burst, refill per second)
+    # plus a sliding-window cap, per client IP and per account. "database" shares the state between workers.
+    login_rate_limit_enabled: bool = True
+    login_rate_limit_backend: Literal["memory", "database"] = "memory"
+    login_rate_limit_max_keys: int = 100000
+    login_rate_limit_prune_every: int = 1000
+    login_ip_burst: int = 20
+    login_ip_per_second: float = 1.0
+    login_ip_window_seconds: int = 900
+    login_ip_window_limit: int = 300
+    login_account_burst: int = 5
+    login_account_per_second: float = 0.2
+    login_account_window_seconds: int = 900
+    login_account_window_limit: int = 30
+
+    principal_cache_ttl_seconds: int = 60
+    principal_cache_max_size: int = 10000
+    token_cache_max_size: int = 10000
+
+    page_size_default: int = 50
+    page_size_max: int = 200
+    stream_batch_size: int = 500
+    export_batch_size: int = 1000
+    # Rows per INSERT/COPY and per transaction when importing resumes.
+    import_batch_size: int = 1000
+    import_max_record_bytes: int = 64 * 1024
+    import_max_errors: int = 1000
+    # Accounts allowed to export resumes of every owner.
+    admin_emails: list[str] = []
+    batch_max_items: int = 1000
+
+    improve_queue_backend: Literal["memory", "database"] = "memory"
+    improve_workers: int = 2
+    improve_batch_size: int = 8
+    improve_batch_wait_ms: int = 20
+    improve_poll_interval_ms: int = 500
+    # A database job still "running" this long after it was claimed is handed to another worker.
+    improve_job_lease_seconds: int = 300
+    improve_job_ttl_seconds: int = 3600
+    improve_job_max_retained: int = 10000
+    improve_cache_memory_size: int = 10000
+    improve_cache_ttl_seconds: int = 7 * 24 * 3600
+    improve_cache_max_rows: int = 100000
+    improve_cache_prune_every: int = 500
+
+    # Shared cache tier and cross-worker invalidation. Empty keeps every cache per process, "local://" uses the
+    # in-process stand-in, anything else is a redis:// URL (needs the redis package).
+    cache_redis_url: str = ""
+    cache_invalidation_channel: str = "cache-invalidation"
+    # How long other workers wait for the one loading a missing key before loading it themselves.
+    cache_lock_ms: int = 2000
+
+    fragment_cache_max_owners: int = 5000
+    fragment_cache_max_entries_per_owner: int = 64
+    fragment_cache_ttl_seconds: int = 300
+
+    fast_json_responses: bool = False
+    compression_enabled: bool = True
+    compression_min_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+
+    metrics_enabled: bool = True
+    # dev: X-Query-* headers and warnings for over-budget routes and repeated statements; strict: fail them.
+    query_budget_mode: Literal["off", "dev", "strict"] = "off"
+    query_repeat_threshold: int = 2
 
     api_v1_prefix: str = '/api/v1'
     alembic_prefix: str = '/alembic'
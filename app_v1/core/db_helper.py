@@ -1,44 +1,238 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, async_scoped_session, AsyncSession
+import hashlib
+import itertools
+import logging
+import time
+
+from fastapi import Request
+from sqlalchemy.engine import make_url, Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import (create_async_engine, async_sessionmaker, async_scoped_session, AsyncSession,
+                                    AsyncConnection, AsyncEngine)
+from sqlalchemy.orm import Session
+from sqlalchemy.util.concurrency import await_only, in_greenlet
 from asyncio import current_task
 
+from .cache import TTLCache
 from .config import settings
+from .metrics import instrument_engine
+from .query_budget import track_queries
+from .shared_cache import RedisLike, shared_store
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, wait: float) -> None:
+        self.checkouts += 1
+        self.wait_seconds += wait
+        self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+
+class LazyRequestBind:
+    # The request's connection, checked out on the session's first query rather than before the route runs:
+    # requests answered from caches or with a 304 never take one from the pool.
+    def __init__(self, helper: "DataBaseHelper", read_only: bool):
+        self.helper = helper
+        self.read_only = read_only
+        self.connection: AsyncConnection | None = None
+
+    def get(self) -> Engine | Connection:
+        if self.connection is None:
+            if not in_greenlet():
+                # Synchronous callers (session.get_bind().dialect) only need the dialect, not a connection.
+                return self.helper.engine.sync_engine
+            started = time.perf_counter()
+            self.connection = await_only(self.helper._connect_read() if self.read_only
+                                         else self.helper.engine.connect())
+            self.helper.pool_stats.record(time.perf_counter() - started)
+        return self.connection.sync_connection
+
+    async def close(self) -> None:
+        if self.connection is not None:
+            await self.connection.close()
+
+
+class RequestSession(Session):
+    def get_bind(self, mapper=None, **kw) -> Engine | Connection:
+        lazy_bind = self.info.get("lazy_bind")
+        return lazy_bind.get() if lazy_bind is not None else super().get_bind(mapper, **kw)
 
 
 class DataBaseHelper:
-    def __init__(self, url: str, echo: bool = False):
-        self.engine = create_async_engine(
-            url=url,
-            echo=echo,
-            future=True,
-            pool_size=5,
-            max_overflow=10
-        )
+    def __init__(self, url: str, echo: bool = False, pool_size: int = 5, max_overflow: int = 10,
+                 pool_timeout: float = 30, pool_recycle: int = -1, pool_pre_ping: bool = False,
+                 statement_cache_size: int = 100, replica_urls: list[str] | None = None,
+                 read_your_writes_seconds: float = 5, replica_retry_seconds: float = 30,
+                 store: RedisLike | None = None):
+        engine_options = dict(echo=echo, pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout,
+                              pool_recycle=pool_recycle, pool_pre_ping=pool_pre_ping,
+                              statement_cache_size=statement_cache_size)
+        self.engine = self._create_engine(url, **engine_options)
+        self.replica_engines = [self._create_engine(replica_url, **engine_options)
+                                for replica_url in replica_urls or []]
+        self._replica_turn = itertools.count()
+        self._replica_down_until = [0.0] * len(self.replica_engines)
+        self.replica_retry_seconds = replica_retry_seconds
+        # Credentials that wrote recently keep reading from the primary until replication has caught up. Without
+        # a shared store this only holds within one worker: the next request may land on another process.
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.recent_writers = TTLCache(maxsize=100000, ttl=read_your_writes_seconds)
+        self.store = store
         self.session_factory = async_sessionmaker(
             bind=self.engine,
             autoflush=True,
             expire_on_commit=False,
             autocommit=False,
         )
-
-    def get_scoped_session(self):
-        session = async_scoped_session(
+        self.scoped_session = async_scoped_session(
             session_factory=self.session_factory,
             scopefunc=current_task
         )
-        return session
+        self.pool_stats = PoolStats()
+
+    @staticmethod
+    def _create_engine(url: str, statement_cache_size: int, **options) -> AsyncEngine:
+        connect_args = {}
+        if make_url(url).get_driver_name() == "asyncpg":
+            # Set to 0 behind pgbouncer in transaction mode, where prepared statements do not survive.
+            connect_args = {"prepared_statement_cache_size": statement_cache_size,
+                            "statement_cache_size": statement_cache_size}
+        engine = create_async_engine(url=url, future=True, connect_args=connect_args, **options)
+        instrument_engine(engine)
+        if settings.query_budget_mode != "off":
+            track_queries(engine)
+        return engine
+
+    async def prewarm(self, connections: int) -> None:
+        # Open the connections together, then return them all to the pool so the first requests find them idle.
+        opened = []
+        try:
+            for engine in (self.engine, *self.replica_engines):
+                for _ in range(connections):
+                    opened.append(await engine.connect())
+        finally:
+            for connection in opened:
+                await connection.close()
+
+    def get_scoped_session(self):
+        return self.scoped_session
+
+    def _replica_order(self) -> list[int]:
+        # Round-robin start; replicas that failed recently are skipped until their retry time.
+        count = len(self.replica_engines)
+        if not count:
+            return []
+        start = next(self._replica_turn)
+        now = time.monotonic()
+        order = [(start + offset) % count for offset in range(count)]
+        return [index for index in order if self._replica_down_until[index] <= now]
+
+    async def _connect_read(self) -> AsyncConnection:
+        for index in self._replica_order():
+            try:
+                return await self.replica_engines[index].connect()
+            except (SQLAlchemyError, OSError):
+                logger.warning("Replica %d is unavailable, retrying in %ss", index, self.replica_retry_seconds)
+                self._replica_down_until[index] = time.monotonic() + self.replica_retry_seconds
+        return await self.engine.connect()
+
+    @staticmethod
+    def _writer_key(credentials: str) -> str:
+        return hashlib.sha1(credentials.encode()).hexdigest()
+
+    @classmethod
+    def _client_key(cls, request: Request) -> str | None:
+        # Keyed on the credentials only: an address is shared by everyone behind the same proxy or NAT.
+        credentials = (request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+                       or request.cookies.get("access_token"))
+        return cls._writer_key(credentials) if credentials else None
+
+    async def _wrote_recently(self, key: str | None) -> bool:
+        if key is None or not self.replica_engines:
+            return False
+        if self.recent_writers.get(key) is not None:
+            return True
+        return self.store is not None and await self.store.get(f"rw:{key}") is not None
+
+    async def _remember_write(self, key: str | None) -> None:
+        if key is None or not self.replica_engines:
+            return
+        self.recent_writers.set(key, True)
+        if self.store is not None:
+            await self.store.set(f"rw:{key}", b"1", px=int(self.read_your_writes_seconds * 1000))
+
+    async def mark_recent_write(self, credentials: str) -> None:
+        # Called with freshly issued tokens too, so the first reads after login or a refresh see the new rows.
+        await self._remember_write(self._writer_key(credentials))
+
+    def read_session(self) -> AsyncSession:
+        # For reads outside a request (streams): the next healthy replica, or the primary.
+        order = self._replica_order()
+        return self.session_factory(bind=self.replica_engines[order[0]] if order else self.engine)
+
+    async def session_dependency(self, request: Request) -> AsyncSession:
+        # The request checks out at most one connection, on its first query, and every later query and commit
+        # of the request runs on it. Safe methods go to a replica unless the same client wrote within the
+        # read-your-writes window.
+        client = self._client_key(request)
+        read_only = request.method in SAFE_METHODS and not await self._wrote_recently(client)
+        lazy_bind = LazyRequestBind(self, read_only)
+        try:
+            async with self.session_factory(sync_session_class=RequestSession,
+                                            info={"lazy_bind": lazy_bind}) as session:
+                yield session
+        finally:
+            await lazy_bind.close()
+        if request.method not in SAFE_METHODS:
+            await self._remember_write(client)
+
+    # Same function under the old name: FastAPI caches dependencies per request by callable, so routes and
+    # get_current_user asking for either one share a single session.
+    scoped_session_dependency = session_dependency
 
-    async def session_dependency(self) -> AsyncSession:
-        async with self.session_factory() as session:
-            yield session
-            await session.close()
+    @staticmethod
+    def _pool_sizes(pool) -> dict:
+        sizes = {}
+        # StaticPool/NullPool (in-memory SQLite) do not track sizes.
+        for name, attr in (("size", "size"), ("in_use", "checkedout"), ("idle", "checkedin")):
+            if hasattr(pool, attr):
+                sizes[name] = getattr(pool, attr)()
+        if hasattr(pool, "overflow"):
+            # QueuePool reports unopened base slots as negative overflow.
+            sizes["overflow"] = max(0, pool.overflow())
+        return sizes
 
-    async def scoped_session_dependency(self) -> AsyncSession:
-        session = self.get_scoped_session()
-        yield session
-        await session.close()
+    def pool_metrics(self) -> dict:
+        checkouts = self.pool_stats.checkouts or 1
+        now = time.monotonic()
+        return {
+            "checkouts": self.pool_stats.checkouts,
+            "avg_checkout_wait_seconds": self.pool_stats.wait_seconds / checkouts,
+            "max_checkout_wait_seconds": self.pool_stats.max_wait_seconds,
+            **self._pool_sizes(self.engine.pool),
+            "replicas": [{"healthy": self._replica_down_until[index] <= now, **self._pool_sizes(engine.pool)}
+                         for index, engine in enumerate(self.replica_engines)],
+        }
 
 
 db_helper = DataBaseHelper(
     url=settings.db_url,
-    echo=settings.db_echo
+    echo=settings.db_echo,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    statement_cache_size=settings.db_statement_cache_size,
+    replica_urls=settings.db_replica_urls,
+    read_your_writes_seconds=settings.db_read_your_writes_seconds,
+    replica_retry_seconds=settings.db_replica_retry_seconds,
+    store=shared_store,
 )
@@ -0,0 +1,80 @@
+import codecs
+import csv
+import io
+from typing import AsyncIterator
+
+
+class RecordTooLarge(ValueError):
+    pass
+
+
+async def ndjson_records(chunks: AsyncIterator[bytes], max_record_bytes: int) -> AsyncIterator[tuple[int, bytes]]:
+    pending = b""
+    number = 0
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            number += 1
+            if len(line) > max_record_bytes:
+                raise RecordTooLarge(f"Record {number} exceeds {max_record_bytes} bytes")
+            if line.strip():
+                yield number, line
+        if len(pending) > max_record_bytes:
+            raise RecordTooLarge(f"Record {number + 1} exceeds {max_record_bytes} bytes")
+    if pending.strip():
+        yield number + 1, pending
+
+
+def _record_boundary(text: str, start: int, quoted: bool) -> tuple[int, bool]:
+    # Last newline outside a quoted field in text[start:], given whether text[start] is inside one; returns it
+    # with the quoting state at the end of text so that the next call only scans what was appended.
+    cut = -1
+    position = start
+    while True:
+        quote = text.find('"', position)
+        if not quoted:
+            newline = text.rfind("\n", position, len(text) if quote < 0 else quote)
+            if newline >= 0:
+                cut = newline
+        if quote < 0:
+            return cut, quoted
+        quoted = not quoted
+        position = quote + 1
+
+
+async def csv_records(chunks: AsyncIterator[bytes], max_record_bytes: int) -> AsyncIterator[tuple[int, dict]]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    header: list[str] | None = None
+    pending = ""
+    scanned = 0
+    quoted = False
+    number = 0
+
+    def parse(text: str):
+        nonlocal header, number
+        for values in csv.reader(io.StringIO(text, newline="")):
+            if not values:
+                continue
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            number += 1
+            if sum(map(len, values)) > max_record_bytes:
+                raise RecordTooLarge(f"Record {number} exceeds {max_record_bytes} bytes")
+            yield number, dict(zip(header, values))
+
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        cut, quoted = _record_boundary(pending, scanned, quoted)
+        scanned = len(pending)
+        if cut >= 0:
+            complete, pending = pending[:cut + 1], pending[cut + 1:]
+            scanned -= cut + 1
+            for record in parse(complete):
+                yield record
+        if len(pending) > max_record_bytes:
+            raise RecordTooLarge(f"Record {number + 1} exceeds {max_record_bytes} bytes")
+    pending += decoder.decode(b"", final=True)
+    for record in parse(pending):
+        yield record
@@ -0,0 +1,178 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        # Plain dict/float updates: everything runs on the event loop, so no lock is needed.
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge(Counter):
+    def dec(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, *labels, value: float) -> None:
+        self._values[labels] = value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]; allocated once per label set, not per observation.
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                cumulative += count
+                bucket_labels = _labels((*self.labelnames, "le"), (*labels, bound))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Counter | Histogram] = []
+        self.collectors: list[Callable[[], Iterable[Counter | Histogram]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Counter | Histogram]]) -> None:
+        # Collectors turn existing stats objects into gauges at scrape time instead of on every event.
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter("http_requests_total", "HTTP requests by route template and status.",
+                                          ("method", "route", "status")))
+http_request_duration = registry.register(Histogram("http_request_duration_seconds",
+                                                    "HTTP request latency by route template.", ("method", "route")))
+http_in_flight = registry.register(Gauge("http_requests_in_flight", "HTTP requests currently being served."))
+db_query_duration = registry.register(Histogram("db_query_duration_seconds",
+                                                "SQL statement execution time by operation.", ("operation",)))
+password_hash_duration = registry.register(Histogram("password_hash_duration_seconds",
+                                                     "bcrypt hash/verify time in the hash pool.", ("operation",),
+                                                     buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)))
+jwt_duration = registry.register(Histogram("jwt_duration_seconds", "JWT encode/decode time (cache misses only).",
+                                           ("operation",),
+                                           buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005)))
+resume_import_rows = registry.register(Counter("resume_import_rows_total", "Rows processed by resume imports by result.",
+                                              ("result",)))
+login_attempts = registry.register(Counter("login_attempts_total",
+                                          "Login attempts seen by the rate limiter by outcome.", ("outcome",)))
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            # FastAPI puts the matched route into the scope; its path is the template, e.g. /resumes/{resume_id}.
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(time.perf_counter() - started, scope["method"], template)
+            http_requests.inc(scope["method"], template, status_code)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        words = statement[:32].split(None, 1)
+        db_query_duration.observe(time.perf_counter() - context._metrics_started,
+                                  words[0].upper() if words else "OTHER")
+
+
+def stats_gauges(prefix: str, help: str, stats: dict, labelnames: tuple[str, ...] = ()) -> Iterable[Gauge]:
+    # With labelnames, stats maps label tuples to stats dicts so that every series shares one gauge.
+    rows = stats if labelnames else {(): stats}
+    gauges: dict[str, Gauge] = {}
+    for labels, row in rows.items():
+        for key, value in row.items():
+            if isinstance(value, (int, float)):
+                gauge = gauges.get(key)
+                if gauge is None:
+                    gauge = gauges[key] = Gauge(f"{prefix}_{key}", help, labelnames)
+                gauge.set(*labels, value=int(value) if isinstance(value, bool) else value)
+    return gauges.values()
@@ -0,0 +1,16 @@
+import base64
+import json
+
+
+def encode_cursor(last_id: int, descending: bool = False) -> str:
+    raw = json.dumps({"id": last_id, "desc": descending}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, bool]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return int(data["id"]), bool(data.get("desc", False))
+    except (ValueError, TypeError, KeyError) as exc:
+        raise ValueError("Invalid cursor") from exc
@@ -0,0 +1,117 @@
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Connection setup (PRAGMA, SET, ...) is not work the route asked for.
+TRACKED_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryTracker:
+    def __init__(self):
+        self.count = 0
+        self.allowance = 0
+        self.statements: Counter[str] = Counter()
+
+    def record(self, statement: str) -> None:
+        self.count += 1
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(statement, times) for statement, times in self.statements.items() if times >= threshold]
+
+
+_tracker: ContextVar[QueryTracker | None] = ContextVar("query_tracker", default=None)
+
+
+def query_budget(limit: int) -> Callable:
+    # Worst case queries for the route, cold caches included.
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.__query_budget__ = limit
+        return endpoint
+
+    return decorator
+
+
+def extend_query_budget(queries: int) -> None:
+    # For routes whose query count grows with the input, e.g. one INSERT per import chunk. The extra statements
+    # may be identical, so they are not reported as repeats either.
+    tracker = _tracker.get()
+    if tracker is not None:
+        tracker.allowance += queries
+
+
+def route_budget(route) -> int | None:
+    return getattr(getattr(route, "endpoint", None), "__query_budget__", None)
+
+
+def routes_without_budget(routes) -> list[str]:
+    return [f"{', '.join(sorted(route.methods))} {route.path}" for route in routes
+            if isinstance(route, APIRoute) and route_budget(route) is None]
+
+
+def track_queries(engine: AsyncEngine) -> None:
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        tracker = _tracker.get()
+        if tracker is not None and statement.lstrip()[:6].upper().startswith(TRACKED_OPERATIONS):
+            tracker.record(statement)
+
+
+class QueryBudgetMiddleware:
+    # dev: report through X-Query-* headers and warnings; strict: also fail the request when over budget.
+    def __init__(self, app: ASGIApp, mode: str = "dev", repeat_threshold: int = 2):
+        self.app = app
+        self.strict = mode == "strict"
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        tracker = QueryTracker()
+        token = _tracker.set(tracker)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], *self.report(scope, tracker)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _tracker.reset(token)
+        budget = route_budget(scope.get("route"))
+        if self.strict and budget is not None and tracker.count > budget + tracker.allowance:
+            raise QueryBudgetExceeded(f"{scope['method']} {scope['route'].path} ran {tracker.count} queries, "
+                                      f"budget is {budget + tracker.allowance}")
+
+    def report(self, scope: Scope, tracker: QueryTracker) -> list[tuple[bytes, bytes]]:
+        route = scope.get("route")
+        budget = route_budget(route)
+        headers = [(b"x-query-count", str(tracker.count).encode())]
+        if budget is not None:
+            budget += tracker.allowance
+            headers.append((b"x-query-budget", str(budget).encode()))
+            if tracker.count > budget:
+                logger.warning("%s %s ran %d queries, budget is %d", scope["method"], route.path, tracker.count,
+                               budget)
+        repeated = tracker.repeated(self.repeat_threshold + tracker.allowance)
+        if repeated:
+            headers.append((b"x-query-repeated", str(sum(times for _, times in repeated)).encode()))
+            for statement, times in repeated:
+                logger.warning("Possible N+1 in %s %s: %d x %s", scope["method"], scope["path"], times,
+                               " ".join(statement.split())[:200])
+        return headers
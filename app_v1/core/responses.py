@@ -0,0 +1,28 @@
+from typing import Any
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from .config import settings
+
+_adapters: dict[Any, TypeAdapter] = {}
+
+
+def _adapter(model: Any) -> TypeAdapter:
+    adapter = _adapters.get(model)
+    if adapter is None:
+        adapter = _adapters[model] = TypeAdapter(model)
+    return adapter
+
+
+def render(response: Response, model: Any, content: Any, headers: dict | None = None,
+           exclude_unset: bool = False, status_code: int = 200) -> Any:
+    # With fast_json_responses the body is validated once and dumped straight to JSON bytes by pydantic-core,
+    # skipping FastAPI's response_model re-validation and jsonable_encoder pass.
+    if not settings.fast_json_responses:
+        if headers:
+            response.headers.update(headers)
+        return content
+    adapter = _adapter(model)
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True), exclude_unset=exclude_unset)
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
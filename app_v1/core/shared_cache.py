@@ -0,0 +1,206 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Hashable, Protocol
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PubSubLike(Protocol):
+    async def subscribe(self, *channels: str) -> None: ...
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0) -> dict | None: ...
+
+    async def aclose(self) -> None: ...
+
+
+class RedisLike(Protocol):
+    # The subset of redis.asyncio.Redis the caches use; LocalRedis implements the same calls in process.
+    async def get(self, name: str) -> bytes | None: ...
+
+    async def set(self, name: str, value: bytes, px: int | None = None, nx: bool = False) -> bool | None: ...
+
+    async def delete(self, *names: str) -> int: ...
+
+    async def incr(self, name: str) -> int: ...
+
+    async def pexpire(self, name: str, time: int) -> bool: ...
+
+    async def publish(self, channel: str, message: str) -> int: ...
+
+    def pubsub(self) -> PubSubLike: ...
+
+
+def _to_bytes(value: Any) -> bytes:
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+class LocalPubSub:
+    def __init__(self, server: "LocalRedis"):
+        self.server = server
+        self.queue: asyncio.Queue[dict] = asyncio.Queue()
+        self.channels: set[str] = set()
+
+    async def subscribe(self, *channels: str) -> None:
+        for channel in channels:
+            self.channels.add(channel)
+            self.server.subscribers[channel].add(self)
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0) -> dict | None:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout) if timeout else self.queue.get_nowait()
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
+            return None
+
+    async def aclose(self) -> None:
+        for channel in self.channels:
+            self.server.subscribers[channel].discard(self)
+        self.channels.clear()
+
+
+class LocalRedis:
+    # In-process stand-in for a Redis server: a single worker, or several caches playing separate workers in a
+    # check script. Same byte-in/byte-out behaviour and expiry semantics as the commands it mirrors.
+    def __init__(self):
+        self.data: dict[str, tuple[float | None, Any]] = {}
+        self.subscribers: dict[str, set[LocalPubSub]] = defaultdict(set)
+
+    def _live(self, name: str) -> Any:
+        item = self.data.get(name)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[name]
+            return None
+        return value
+
+    async def get(self, name: str) -> bytes | None:
+        value = self._live(name)
+        return value if isinstance(value, bytes) else None
+
+    async def set(self, name: str, value: bytes, px: int | None = None, nx: bool = False) -> bool | None:
+        if nx and self._live(name) is not None:
+            return None
+        self.data[name] = (time.monotonic() + px / 1000 if px else None, _to_bytes(value))
+        return True
+
+    async def delete(self, *names: str) -> int:
+        deleted = 0
+        for name in names:
+            if self._live(name) is not None:
+                del self.data[name]
+                deleted += 1
+        return deleted
+
+    async def incr(self, name: str) -> int:
+        # Keeps the key's expiry, like INCR.
+        current = self._live(name)
+        expires_at = self.data[name][0] if current is not None else None
+        value = int(current or 0) + 1
+        self.data[name] = (expires_at, str(value).encode())
+        return value
+
+    async def pexpire(self, name: str, milliseconds: int) -> bool:
+        value = self._live(name)
+        if value is None:
+            return False
+        self.data[name] = (time.monotonic() + milliseconds / 1000, value)
+        return True
+
+    async def publish(self, channel: str, message: str) -> int:
+        subscribers = self.subscribers.get(channel, ())
+        for subscriber in subscribers:
+            subscriber.queue.put_nowait({"type": "message", "channel": channel.encode(), "data": _to_bytes(message)})
+        return len(subscribers)
+
+    def pubsub(self) -> LocalPubSub:
+        return LocalPubSub(self)
+
+
+def build_shared_store(url: str) -> RedisLike | None:
+    if not url:
+        return None
+    if url.startswith("local://"):
+        return LocalRedis()
+    try:
+        import redis.asyncio
+    except ImportError:  # redis is optional, only needed for a real shared tier
+        raise RuntimeError("cache_redis_url needs the redis package (pip install redis)")
+    return redis.asyncio.from_url(url)
+
+
+class InvalidationBus:
+    # Pub/sub fan-out of invalidated keys so that every worker drops its local copies. A message lost while a
+    # worker is disconnected is only bounded by the local tier's TTL.
+    def __init__(self, store: RedisLike | None, channel: str):
+        self.store = store
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self.sent = 0
+        self.received = 0
+        self._handlers: dict[str, Callable[[list], None]] = {}
+        self._pubsub: PubSubLike | None = None
+        self._task: asyncio.Task | None = None
+
+    def register(self, namespace: str, handler: Callable[[list], None]) -> None:
+        self._handlers[namespace] = handler
+
+    async def publish(self, namespace: str, keys: tuple[Hashable, ...]) -> None:
+        if self.store is None:
+            return
+        await self.store.publish(self.channel, json.dumps({"origin": self.origin, "namespace": namespace,
+                                                           "keys": list(keys)}))
+        self.sent += 1
+
+    def dispatch(self, data: bytes) -> None:
+        message = json.loads(data)
+        if message["origin"] == self.origin:
+            return
+        handler = self._handlers.get(message["namespace"])
+        if handler is not None:
+            handler(message["keys"])
+            self.received += 1
+
+    async def start(self) -> None:
+        if self.store is None or self._task is not None:
+            return
+        self._pubsub = self.store.pubsub()
+        await self._pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None and message["type"] == "message":
+                    self.dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Cache invalidation listener failed")
+                await asyncio.sleep(1)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "received": self.received, "listening": self._task is not None}
+
+
+shared_store = build_shared_store(settings.cache_redis_url)
+invalidation_bus = InvalidationBus(shared_store, settings.cache_invalidation_channel)
@@ -0,0 +1,56 @@
+import re
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .config import BASE_DIR
+
+VERSIONS_DIR = BASE_DIR / "alembic" / "versions"
+
+REVISION_RE = re.compile(r"^revision\b[^=]*=\s*['\"]([^'\"]+)['\"]", re.MULTILINE)
+DOWN_REVISION_RE = re.compile(r"^down_revision\b[^=]*=(.*)$", re.MULTILINE)
+
+
+class SchemaOutOfDateError(RuntimeError):
+    pass
+
+
+def alembic_heads() -> set[str]:
+    # Reads the revision ids straight from the version files: importing alembic and loading every
+    # migration module would cost more than the rest of the startup.
+    revisions, parents = set(), set()
+    for path in VERSIONS_DIR.glob("*.py"):
+        source = path.read_text(encoding="utf-8")
+        revision = REVISION_RE.search(source)
+        if revision is None:
+            continue
+        revisions.add(revision.group(1))
+        down_revision = DOWN_REVISION_RE.search(source)
+        if down_revision is not None:
+            parents.update(re.findall(r"['\"]([^'\"]+)['\"]", down_revision.group(1)))
+    return revisions - parents
+
+
+async def database_revisions(engine: AsyncEngine) -> set[str]:
+    async with engine.connect() as conn:
+        try:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+        except DBAPIError:
+            return set()
+        return set(result.scalars().all())
+
+
+async def prepare_schema(engine: AsyncEngine, mode: str) -> None:
+    if mode == "skip":
+        return
+    if mode == "check":
+        expected, current = alembic_heads(), await database_revisions(engine)
+        if current != expected:
+            raise SchemaOutOfDateError(f"Database is at {sorted(current) or 'no revision'}, code expects "
+                                       f"{sorted(expected)}; run `alembic upgrade head`")
+        return
+    from app_v1.models.base import Base
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
@@ -0,0 +1,13 @@
+from fastapi.templating import Jinja2Templates
+
+from .config import BASE_DIR
+
+TEMPLATES_DIR = BASE_DIR / "templates"
+
+templates = Jinja2Templates(directory=TEMPLATES_DIR)
+
+
+def warm_templates() -> None:
+    # Compile every template up front so the first request of each worker does not pay for it.
+    for name in templates.env.list_templates():
+        templates.get_template(name)
@@ -0,0 +1,4 @@
+from .cache import ImprovementCache, content_key, improvement_cache
+from .queue import JobQueue, InMemoryJobQueue, DatabaseJobQueue, build_job_queue, improvement_queue
+from .worker import ImprovementWorkerPool, improvement_workers
+from .service import request_improvement
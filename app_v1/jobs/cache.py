@@ -0,0 +1,120 @@
+import hashlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app_v1.core import db_helper, settings
+from app_v1.core.cache import TTLCache
+from app_v1.models import ImprovementCacheEntry
+from .improver import IMPROVER_VERSION
+
+
+def content_key(title: str, description: str | None) -> str:
+    normalized = " ".join(title.split()) + "\x1f" + " ".join((description or "").split())
+    return hashlib.sha256(f"{IMPROVER_VERSION}\x1e{normalized}".encode()).hexdigest()
+
+
+class ImprovementCache:
+    def __init__(self, session_factory: async_sessionmaker, memory_size: int, ttl: float, max_rows: int,
+                 prune_every: int):
+        self.session_factory = session_factory
+        self.memory = TTLCache(maxsize=memory_size, ttl=ttl)
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._writes_since_prune = 0
+
+    async def get_many(self, keys: list[str]) -> dict[str, str]:
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.memory.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        self.memory_hits += len(found)
+        if missing:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(ImprovementCacheEntry.id, ImprovementCacheEntry.description)
+                    .where(ImprovementCacheEntry.id.in_(missing), ImprovementCacheEntry.expires_at > datetime.utcnow())
+                )
+                for key, description in result.all():
+                    found[key] = description
+                    self.memory.set(key, description)
+                    self.db_hits += 1
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def get(self, key: str) -> str | None:
+        return (await self.get_many([key])).get(key)
+
+    async def set_many(self, values: dict[str, str]) -> None:
+        if not values:
+            return
+        now = datetime.utcnow()
+        rows = [
+            {"id": key, "improver_version": IMPROVER_VERSION, "description": description,
+             "created_at": now, "expires_at": now + timedelta(seconds=self.ttl)}
+            for key, description in values.items()
+        ]
+        async with self.session_factory() as session:
+            dialect = session.get_bind().dialect.name
+            if dialect in ("postgresql", "sqlite"):
+                # Imported on use: the postgresql dialect package alone costs ~40 ms of startup on SQLite.
+                from sqlalchemy.dialects import postgresql, sqlite
+                upsert = (postgresql if dialect == "postgresql" else sqlite).insert(ImprovementCacheEntry)
+                stmt = upsert.on_conflict_do_update(
+                    index_elements=[ImprovementCacheEntry.id],
+                    set_={"description": upsert.excluded.description,
+                          "created_at": upsert.excluded.created_at,
+                          "expires_at": upsert.excluded.expires_at},
+                )
+                await session.execute(stmt, rows)
+            else:
+                await session.execute(delete(ImprovementCacheEntry).where(ImprovementCacheEntry.id.in_(values)))
+                await session.execute(insert(ImprovementCacheEntry), rows)
+            await session.commit()
+        for key, description in values.items():
+            self.memory.set(key, description)
+        self._writes_since_prune += len(values)
+        if self._writes_since_prune >= self.prune_every:
+            self._writes_since_prune = 0
+            await self.prune()
+
+    async def prune(self) -> None:
+        async with self.session_factory() as session:
+            await session.execute(
+                delete(ImprovementCacheEntry).where(ImprovementCacheEntry.expires_at <= datetime.utcnow())
+            )
+            overflow = (
+                select(ImprovementCacheEntry.id)
+                .order_by(ImprovementCacheEntry.created_at.desc())
+                .offset(self.max_rows)
+            )
+            await session.execute(delete(ImprovementCacheEntry).where(ImprovementCacheEntry.id.in_(overflow)))
+            await session.commit()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory": self.memory.stats(),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+        }
+
+
+improvement_cache = ImprovementCache(
+    session_factory=db_helper.session_factory,
+    memory_size=settings.improve_cache_memory_size,
+    ttl=settings.improve_cache_ttl_seconds,
+    max_rows=settings.improve_cache_max_rows,
+    prune_every=settings.improve_cache_prune_every,
+)
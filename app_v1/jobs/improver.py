@@ -0,0 +1,17 @@
+IMPROVER_VERSION = "stub-1"
+
+IMPROVED_MARKER = "[Improved]"
+IMPROVEMENT_SUFFIX = (" Умение работать в режиме многозадачности и высокие аналитические"
+                      " способности позволяют мне эффективно работать с большими объёмами информации, "
+                      "быстро находить качественные решения сложных задач. " + IMPROVED_MARKER)
+
+
+def improve_description(title: str, description: str | None) -> str:
+    if description and IMPROVED_MARKER in description:
+        return description
+    return (description or "") + IMPROVEMENT_SUFFIX
+
+
+async def improve_descriptions(items: list[tuple[str, str | None]]) -> list[str]:
+    # Takes a whole micro-batch at once so a real model backend can serve it with a single call.
+    return [improve_description(title, description) for title, description in items]
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app_v1.core import db_helper, settings
+from app_v1.core.cache import TTLCache
+from app_v1.models import ImprovementJob
+from app_v1.schemas.improvement_job import ImprovementJobRead
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue(ABC):
+    @abstractmethod
+    async def enqueue(self, resume_id: int, owner_id: int) -> ImprovementJobRead:
+        ...
+
+    @abstractmethod
+    async def record_done(self, resume_id: int, owner_id: int, description: str) -> ImprovementJobRead:
+        ...
+
+    @abstractmethod
+    async def dequeue_batch(self, max_items: int, timeout: float, batch_wait: float) -> list[ImprovementJobRead]:
+        ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> ImprovementJobRead | None:
+        ...
+
+    @abstractmethod
+    async def complete(self, job_id: str, description: str) -> None:
+        ...
+
+    @abstractmethod
+    async def fail(self, job_id: str, error: str) -> None:
+        ...
+
+
+class InMemoryJobQueue(JobQueue):
+    def __init__(self, ttl: float, max_retained: int):
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._pending: dict[str, ImprovementJobRead] = {}
+        self._finished = TTLCache(maxsize=max_retained, ttl=ttl)
+
+    async def enqueue(self, resume_id: int, owner_id: int) -> ImprovementJobRead:
+        job = ImprovementJobRead(id=str(uuid.uuid4()), resume_id=resume_id, owner_id=owner_id, status="queued")
+        self._pending[job.id] = job
+        self._queue.put_nowait(job.id)
+        return job
+
+    async def record_done(self, resume_id: int, owner_id: int, description: str) -> ImprovementJobRead:
+        job = ImprovementJobRead(id=str(uuid.uuid4()), resume_id=resume_id, owner_id=owner_id, status="done",
+                                 description=description)
+        self._finished.set(job.id, job)
+        return job
+
+    async def dequeue_batch(self, max_items: int, timeout: float, batch_wait: float) -> list[ImprovementJobRead]:
+        loop = asyncio.get_running_loop()
+        try:
+            job_ids = [await asyncio.wait_for(self._queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        deadline = loop.time() + batch_wait
+        while len(job_ids) < max_items:
+            if not self._queue.empty():
+                job_ids.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                job_ids.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        jobs = []
+        for job_id in job_ids:
+            job = self._pending[job_id]
+            job.status = "running"
+            jobs.append(job)
+        return jobs
+
+    async def get(self, job_id: str) -> ImprovementJobRead | None:
+        return self._pending.get(job_id) or self._finished.get(job_id)
+
+    async def complete(self, job_id: str, description: str) -> None:
+        self._finish(job_id, status="done", description=description)
+
+    async def fail(self, job_id: str, error: str) -> None:
+        self._finish(job_id, status="failed", error=error)
+
+    def _finish(self, job_id: str, **changes) -> None:
+        job = self._pending.pop(job_id, None)
+        if job is not None:
+            self._finished.set(job_id, job.model_copy(update=changes))
+
+
+class DatabaseJobQueue(JobQueue):
+    # Claimed jobs are leased: a job still "running" lease_seconds after it was claimed belongs to a worker that
+    # crashed or was killed, and goes back to "queued".
+    def __init__(self, session_factory: async_sessionmaker, poll_interval: float, lease_seconds: float):
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.requeued = 0
+        self._requeued_at = float("-inf")
+
+    async def enqueue(self, resume_id: int, owner_id: int) -> ImprovementJobRead:
+        return await self._insert(resume_id=resume_id, owner_id=owner_id, status="queued")
+
+    async def record_done(self, resume_id: int, owner_id: int, description: str) -> ImprovementJobRead:
+        return await self._insert(resume_id=resume_id, owner_id=owner_id, status="done", description=description)
+
+    async def _insert(self, **values) -> ImprovementJobRead:
+        job = ImprovementJob(id=str(uuid.uuid4()), **values)
+        async with self.session_factory() as session:
+            session.add(job)
+            await session.commit()
+        return ImprovementJobRead.model_validate(job)
+
+    async def dequeue_batch(self, max_items: int, timeout: float, batch_wait: float) -> list[ImprovementJobRead]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        if loop.time() - self._requeued_at >= self.lease_seconds / 2:
+            self._requeued_at = loop.time()
+            await self.requeue_expired()
+        jobs = await self._claim(max_items)
+        while not jobs and loop.time() < deadline:
+            await asyncio.sleep(min(self.poll_interval, max(0.0, deadline - loop.time())))
+            jobs = await self._claim(max_items)
+        if jobs and len(jobs) < max_items and batch_wait > 0:
+            await asyncio.sleep(batch_wait)
+            jobs += await self._claim(max_items - len(jobs))
+        return jobs
+
+    async def _claim(self, limit: int) -> list[ImprovementJobRead]:
+        queued = (
+            select(ImprovementJob.id)
+            .where(ImprovementJob.status == "queued")
+            .order_by(ImprovementJob.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        async with self.session_factory() as session:
+            result = await session.execute(
+                update(ImprovementJob)
+                .where(ImprovementJob.id.in_(queued.scalar_subquery()), ImprovementJob.status == "queued")
+                .values(status="running")
+                .returning(ImprovementJob)
+                .execution_options(synchronize_session=False)
+            )
+            jobs = [ImprovementJobRead.model_validate(job) for job in result.scalars().all()]
+            await session.commit()
+        return jobs
+
+    async def requeue_expired(self) -> int:
+        expired_before = datetime.now(timezone.utc) - timedelta(seconds=self.lease_seconds)
+        async with self.session_factory() as session:
+            result = await session.execute(
+                update(ImprovementJob)
+                .where(ImprovementJob.status == "running", ImprovementJob.updated_at < expired_before)
+                .values(status="queued")
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        if result.rowcount:
+            logger.warning("Requeued %d improvement jobs whose lease expired", result.rowcount)
+            self.requeued += result.rowcount
+        return result.rowcount
+
+    async def get(self, job_id: str) -> ImprovementJobRead | None:
+        async with self.session_factory() as session:
+            job = await session.get(ImprovementJob, job_id)
+            return ImprovementJobRead.model_validate(job) if job else None
+
+    async def complete(self, job_id: str, description: str) -> None:
+        await self._finish(job_id, status="done", description=description)
+
+    async def fail(self, job_id: str, error: str) -> None:
+        await self._finish(job_id, status="failed", error=error[:200])
+
+    async def _finish(self, job_id: str, **values) -> None:
+        async with self.session_factory() as session:
+            await session.execute(update(ImprovementJob).where(ImprovementJob.id == job_id).values(**values))
+            await session.commit()
+
+
+def build_job_queue(backend: str) -> JobQueue:
+    if backend == "database":
+        return DatabaseJobQueue(session_factory=db_helper.session_factory,
+                                poll_interval=settings.improve_poll_interval_ms / 1000,
+                                lease_seconds=settings.improve_job_lease_seconds)
+    return InMemoryJobQueue(ttl=settings.improve_job_ttl_seconds, max_retained=settings.improve_job_max_retained)
+
+
+improvement_queue = build_job_queue(settings.improve_queue_backend)
@@ -0,0 +1,18 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app_v1.models import Resume
+from app_v1.repositories import resume_repository
+from app_v1.schemas.improvement_job import ImprovementJobRead
+from .cache import content_key, improvement_cache
+from .queue import improvement_queue
+
+
+async def request_improvement(session: AsyncSession, resume: Resume) -> ImprovementJobRead:
+    # Already-seen content is answered from the cache right away instead of going through the workers.
+    cached = await improvement_cache.get(content_key(resume.title, resume.description))
+    if cached is not None and await resume_repository.update_descriptions(
+            session, {resume.id: cached}, {resume.id: resume.version}, {resume.owner_id}):
+        return await improvement_queue.record_done(resume_id=resume.id, owner_id=resume.owner_id,
+                                                    description=cached)
+    # Not seen yet, or edited after it was read so that the cached text is for the old content: the workers redo it.
+    return await improvement_queue.enqueue(resume_id=resume.id, owner_id=resume.owner_id)
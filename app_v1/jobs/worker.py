@@ -0,0 +1,104 @@
+import asyncio
+import logging
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app_v1.core import db_helper, settings
+from app_v1.repositories import resume_repository
+from app_v1.schemas.improvement_job import ImprovementJobRead
+from .cache import ImprovementCache, content_key, improvement_cache
+from .improver import improve_descriptions
+from .queue import JobQueue, improvement_queue
+
+logger = logging.getLogger(__name__)
+
+
+class ImprovementWorkerPool:
+    def __init__(self, queue: JobQueue, cache: ImprovementCache, session_factory: async_sessionmaker,
+                 concurrency: int, batch_size: int, batch_wait: float, poll_timeout: float = 1.0,
+                 max_backoff: float = 30.0):
+        self.queue = queue
+        self.cache = cache
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.poll_timeout = poll_timeout
+        self.max_backoff = max_backoff
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._run(), name=f"improvement-worker-{n}")
+                       for n in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self) -> None:
+        # Nothing may end this loop but stop(): a worker task that dies leaves the queue without a consumer.
+        backoff = 0.0
+        while True:
+            try:
+                jobs = await self.queue.dequeue_batch(self.batch_size, self.poll_timeout, self.batch_wait)
+                if jobs:
+                    await self._process_or_fail(jobs)
+                backoff = 0.0
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                backoff = min(self.max_backoff, backoff * 2 or self.poll_timeout)
+                logger.exception("Improvement worker failed, retrying in %.1fs", backoff)
+                await asyncio.sleep(backoff)
+
+    async def _process_or_fail(self, jobs: list[ImprovementJobRead]) -> None:
+        try:
+            await self.process(jobs)
+        except Exception as exc:
+            logger.exception("Improvement batch of %d jobs failed", len(jobs))
+            # If marking them fails too, the jobs stay claimed until the queue's lease hands them out again.
+            for job in jobs:
+                await self.queue.fail(job.id, str(exc) or exc.__class__.__name__)
+
+    async def process(self, jobs: list[ImprovementJobRead]) -> None:
+        wanted = {(job.resume_id, job.owner_id) for job in jobs}
+        async with self.session_factory() as session:
+            found = await resume_repository.get_resumes_by_ids(session, [resume_id for resume_id, _ in wanted])
+            resumes = {resume.id: resume for resume in found if (resume.id, resume.owner_id) in wanted}
+            keys = {resume.id: content_key(resume.title, resume.description) for resume in resumes.values()}
+            cached = await self.cache.get_many(list(set(keys.values())))
+            pending = {}
+            for resume in resumes.values():
+                if keys[resume.id] not in cached:
+                    pending.setdefault(keys[resume.id], resume)
+            improved = await improve_descriptions([(resume.title, resume.description) for resume in pending.values()])
+            fresh = dict(zip(pending, improved))
+            await self.cache.set_many(fresh)
+            results = cached | fresh
+            descriptions = {resume_id: results[key] for resume_id, key in keys.items()}
+            updated = await resume_repository.update_descriptions(
+                session, descriptions, {resume.id: resume.version for resume in resumes.values()},
+                {resume.owner_id for resume in resumes.values()})
+
+        for job in jobs:
+            resume = resumes.get(job.resume_id)
+            if resume is None or resume.owner_id != job.owner_id:
+                await self.queue.fail(job.id, "Resume not found")
+            elif job.resume_id not in updated:
+                await self.queue.fail(job.id, "Superseded: the resume was edited while it was being improved")
+            else:
+                await self.queue.complete(job.id, descriptions[job.resume_id])
+
+
+improvement_workers = ImprovementWorkerPool(
+    queue=improvement_queue,
+    cache=improvement_cache,
+    session_factory=db_helper.session_factory,
+    concurrency=settings.improve_workers,
+    batch_size=settings.improve_batch_size,
+    batch_wait=settings.improve_batch_wait_ms / 1000,
+)
@@ -1,4 +1,8 @@
 from .user import User
 from .resume import Resume
+from .improvement_job import ImprovementJob
+from .improvement_cache import ImprovementCacheEntry
+from .login_throttle import LoginThrottle
+from .refresh_token import RefreshToken
 
-__all__ = ["User", "Resume"]
+__all__ = ["User", "Resume", "ImprovementJob", "ImprovementCacheEntry", "LoginThrottle", "RefreshToken"]
@@ -0,0 +1,15 @@
+from datetime import datetime
+
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Text, DateTime
+from .base import Base
+
+
+class ImprovementCacheEntry(Base):
+    __tablename__ = "improvement_cache"
+
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    improver_version: Mapped[str] = mapped_column(String(32), nullable=False)
+    description: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
@@ -0,0 +1,15 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Float, Integer
+from .base import Base
+
+
+class LoginThrottle(Base):
+    # Rate limiter state shared by all workers when login_rate_limit_backend is "database".
+    __tablename__ = "login_throttle"
+
+    id: Mapped[str] = mapped_column(String(200), primary_key=True)
+    tokens: Mapped[float] = mapped_column(Float, nullable=False)
+    refilled_at: Mapped[float] = mapped_column(Float, nullable=False, index=True)
+    window_started_at: Mapped[float] = mapped_column(Float, nullable=False)
+    window_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    previous_count: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -1,5 +1,8 @@
+import secrets
+from datetime import datetime
+
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, ForeignKey
+from sqlalchemy import Integer, String, ForeignKey, DateTime, DDL, Index, event
 from typing import Optional, TYPE_CHECKING
 from .base import Base
 
@@ -7,6 +10,10 @@ if TYPE_CHECKING:
     from .user import User
 
 
+def new_incarnation() -> str:
+    return secrets.token_hex(4)
+
+
 class Resume(Base):
     __tablename__ = "resumes"
 
@@ -14,5 +21,42 @@ class Resume(Base):
     title: Mapped[str] = mapped_column(String(50), nullable=False)
     description: Mapped[Optional[str]] = mapped_column(String(400), nullable=True)
     owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow,
+                                                 server_default="1970-01-01 00:00:00")
+    # Random per row: SQLite reuses the id of a deleted newest row and versions restart at 1, so the ETag needs
+    # something that tells a re-created resume from the one it replaced.
+    incarnation: Mapped[str] = mapped_column(String(8), nullable=False, default=new_incarnation, server_default="")
 
     owner: Mapped["User"] = relationship("User", back_populates="resumes")
+
+    # Every list query filters by owner and pages by id.
+    __table_args__ = (Index("ix_resumes_owner_id_id", "owner_id", "id"),)
+
+
+# Full-text search index, kept in sync by the database itself: a generated tsvector column on PostgreSQL and
+# an external-content FTS5 table maintained by triggers on SQLite. Mirrors migration 5c1f0a7d2e43.
+RESUME_SEARCH_DDL = {
+    "postgresql": [
+        "ALTER TABLE resumes ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+        "(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))) STORED",
+        "CREATE INDEX ix_resumes_search_vector ON resumes USING gin (search_vector)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE resumes_fts USING fts5("
+        "title, description, content='resumes', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER resumes_fts_ai AFTER INSERT ON resumes BEGIN "
+        "INSERT INTO resumes_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        "CREATE TRIGGER resumes_fts_ad AFTER DELETE ON resumes BEGIN "
+        "INSERT INTO resumes_fts(resumes_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END",
+        "CREATE TRIGGER resumes_fts_au AFTER UPDATE ON resumes BEGIN "
+        "INSERT INTO resumes_fts(resumes_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO resumes_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    ],
+}
+
+for _dialect, _statements in RESUME_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Resume.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .base import Base
-from sqlalchemy import Integer, String
+from sqlalchemy import Integer, String, Index, func
 from typing import List, TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -16,3 +16,6 @@ class User(Base):
     password: Mapped[str] = mapped_column(String(100), nullable=False)
 
     resumes: Mapped[List["Resume"]] = relationship("Resume", back_populates="owner")
+
+    # Emails are matched case-insensitively; lookups must compare lower(email) to hit this index.
+    __table_args__ = (Index("ux_users_email_lower", func.lower(email), unique=True),)
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app_v1.models.refresh_token import RefreshToken
+
+
+async def add_refresh_token(session: AsyncSession, token_id: str, user_id: int, expires_at: datetime) -> None:
+    await session.execute(insert(RefreshToken).values(id=token_id, user_id=user_id, expires_at=expires_at))
+
+
+async def consume_refresh_token(session: AsyncSession, token_id: str, user_id: int, replaced_by: str) -> bool:
+    # Revokes the token and reports whether it was still usable, in one statement on the primary key.
+    result = await session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == token_id, RefreshToken.user_id == user_id, RefreshToken.revoked.is_(False),
+               RefreshToken.expires_at > datetime.utcnow())
+        .values(revoked=True, replaced_by=replaced_by, rotated_at=datetime.utcnow())
+        .returning(RefreshToken.id)
+    )
+    return result.scalar_one_or_none() is not None
+
+
+async def get_replacement(session: AsyncSession, token_id: str, user_id: int,
+                          rotated_after: datetime) -> RefreshToken | None:
+    # The still usable token that replaced token_id, if token_id was rotated after rotated_after.
+    replacement = aliased(RefreshToken)
+    result = await session.execute(
+        select(replacement)
+        .join(RefreshToken, RefreshToken.replaced_by == replacement.id)
+        .where(RefreshToken.id == token_id, RefreshToken.user_id == user_id,
+               RefreshToken.rotated_at > rotated_after, replacement.revoked.is_(False),
+               replacement.expires_at > datetime.utcnow())
+    )
+    return result.scalar_one_or_none()
+
+
+async def revoke_refresh_token(session: AsyncSession, token_id: str) -> None:
+    await session.execute(update(RefreshToken).where(RefreshToken.id == token_id).values(revoked=True))
+
+
+async def revoke_user_refresh_tokens(session: AsyncSession, user_id: int) -> None:
+    await session.execute(update(RefreshToken).where(RefreshToken.user_id == user_id).values(revoked=True))
+
+
+async def delete_expired_refresh_tokens(session: AsyncSession) -> None:
+    await session.execute(delete(RefreshToken).where(RefreshToken.expires_at <= datetime.utcnow()))
@@ -1,13 +1,96 @@
+from typing import AsyncIterator, Sequence
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.engine import Result
-from app_v1.models.resume import Resume
-from app_v1.schemas.resume import ResumeCreate, ResumeUpdate, ResumeUpdatePartial
+from datetime import datetime
+
+from sqlalchemy import (select, insert, update, delete, func, literal_column, or_, and_, case, false, table, column,
+                        bindparam)
+from sqlalchemy.engine import Result, Row
+from app_v1.core.cache import resume_fragment_cache
+from app_v1.models.resume import Resume, new_incarnation
+from app_v1.schemas.resume import ResumeCreate, ResumeUpdate, ResumeUpdatePartial, ResumeBatchUpdateItem
+
+
+RESUME_FIELDS = ("id", "title", "description", "owner_id", "version")
+
+
+async def get_resumes(session: AsyncSession, owner_id: int, limit: int | None = None, after_id: int | None = None,
+                      descending: bool = False, fields: list[str] | None = None) -> tuple[list, int | None]:
+    if fields:
+        columns = [getattr(Resume, name) for name in RESUME_FIELDS if name == "id" or name in fields]
+        stmt = select(*columns)
+    else:
+        stmt = select(Resume)
+    stmt = stmt.where(Resume.owner_id == owner_id)
+    if after_id is not None:
+        stmt = stmt.where(Resume.id < after_id if descending else Resume.id > after_id)
+    stmt = stmt.order_by(Resume.id.desc() if descending else Resume.id)
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+
+    result = await session.execute(stmt)
+    if fields:
+        rows = [dict(row._mapping) for row in result.all()]
+    else:
+        rows = list(result.scalars().all())
+
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, last["id"] if fields else last.id
 
 
-async def get_resumes(session: AsyncSession, owner_id: int):
-    result = await session.execute(select(Resume).where(Resume.owner_id == owner_id).order_by(Resume.id))
-    return result.scalars().all()
+async def stream_resume_rows(session: AsyncSession, owner_id: int | None = None,
+                             batch_size: int = 1000) -> AsyncIterator[Sequence[Row]]:
+    # Server-side cursor on asyncpg; rows come back in batch_size partitions and are never held all at once.
+    stmt = select(*(getattr(Resume, name) for name in RESUME_FIELDS)).order_by(Resume.id)
+    if owner_id is not None:
+        stmt = stmt.where(Resume.owner_id == owner_id)
+    result = await session.stream(stmt.execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        yield rows
+
+
+def _fts5_query(query: str) -> str:
+    # Quote every term so user input is matched literally instead of being parsed as FTS5 syntax.
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+async def search_resumes(session: AsyncSession, owner_id: int, query: str, limit: int) -> list[dict]:
+    if not query.strip():
+        return []
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        ts_query = func.websearch_to_tsquery("simple", query)
+        search_vector = literal_column("resumes.search_vector")
+        rank = func.ts_rank(search_vector, ts_query)
+        stmt = (
+            select(Resume, rank.label("rank"))
+            .where(Resume.owner_id == owner_id, search_vector.op("@@")(ts_query))
+            .order_by(rank.desc(), Resume.id)
+        )
+    elif dialect == "sqlite":
+        fts = table("resumes_fts", column("rowid"), column("rank"))
+        stmt = (
+            select(Resume, (-fts.c.rank).label("rank"))
+            .join(fts, fts.c.rowid == Resume.id)
+            .where(Resume.owner_id == owner_id, literal_column("resumes_fts").op("MATCH")(_fts5_query(query)))
+            .order_by(fts.c.rank, Resume.id)
+        )
+    else:
+        pattern = f"%{query}%"
+        stmt = (
+            select(Resume, literal_column("0.0").label("rank"))
+            .where(Resume.owner_id == owner_id, or_(Resume.title.ilike(pattern), Resume.description.ilike(pattern)))
+            .order_by(Resume.id)
+        )
+    result = await session.execute(stmt.limit(limit))
+    return [
+        {"id": resume.id, "title": resume.title, "description": resume.description,
+         "owner_id": resume.owner_id, "version": resume.version, "rank": rank}
+        for resume, rank in result.all()
+    ]
 
 
 async def get_resume_by_id(session: AsyncSession, resume_id: int) -> Resume | None:
@@ -15,39 +98,183 @@ async def get_resume_by_id(session: AsyncSession, resume_id: int) -> Resume | No
 
 
 async def create_resume(session: AsyncSession, resume_in: ResumeCreate, owner_id: int) -> Resume:
-    db_resume = Resume(
-        title=resume_in.title,
-        description=resume_in.description,
-        owner_id=owner_id
+    result = await session.execute(
+        insert(Resume)
+        .values(title=resume_in.title, description=resume_in.description, owner_id=owner_id)
+        .returning(Resume)
     )
-    session.add(db_resume)
+    db_resume = result.scalar_one()
     await session.commit()
-    await session.refresh(db_resume)
+    await resume_fragment_cache.invalidate(owner_id)
     return db_resume
 
 
-async def update_resume(session: AsyncSession, resume: Resume, resume_update: ResumeUpdate | ResumeUpdatePartial,
-                        partial: bool = False, ) -> Resume:
-    for key, value in resume_update.model_dump(exclude_unset=partial).items():
-        setattr(resume, key, value)
+def _owned(resume_id: int, owner_id: int, expected_versions: list[tuple[str, int]] | None = None) -> list:
+    criteria = [Resume.id == resume_id, Resume.owner_id == owner_id]
+    if expected_versions is not None:
+        criteria.append(or_(false(), *(and_(Resume.incarnation == incarnation, Resume.version == version)
+                                       for incarnation, version in expected_versions)))
+    return criteria
+
+
+async def update_resume(session: AsyncSession, resume_id: int, owner_id: int,
+                        resume_update: ResumeUpdate | ResumeUpdatePartial, partial: bool = False,
+                        expected_versions: list[tuple[str, int]] | None = None) -> Resume | None:
+    values = resume_update.model_dump(exclude_unset=partial)
+    if not values:
+        result = await session.execute(select(Resume).where(*_owned(resume_id, owner_id, expected_versions)))
+        return result.scalar_one_or_none()
+    result = await session.execute(
+        update(Resume)
+        .where(*_owned(resume_id, owner_id, expected_versions))
+        .values(**values, version=Resume.version + 1, updated_at=datetime.utcnow())
+        .returning(Resume)
+    )
+    resume = result.scalar_one_or_none()
     await session.commit()
-    await session.refresh(resume)
+    await resume_fragment_cache.invalidate(owner_id)
     return resume
 
 
-async def delete_resume(session: AsyncSession, resume: Resume) -> None:
-    await session.delete(resume)
+async def resume_exists(session: AsyncSession, resume_id: int, owner_id: int) -> bool:
+    result = await session.execute(select(Resume.id).where(*_owned(resume_id, owner_id)))
+    return result.scalar_one_or_none() is not None
+
+
+async def get_collection_version(session: AsyncSession, owner_id: int) -> str:
+    # Any delete lowers the count and any update raises the version sum. Ids can be reused (SQLite hands out
+    # max(rowid) + 1 again after the newest row is deleted), so a create is caught by max(updated_at) instead.
+    result = await session.execute(
+        select(func.count(Resume.id), func.max(Resume.id), func.coalesce(func.sum(Resume.version), 0),
+               func.max(Resume.updated_at))
+        .where(Resume.owner_id == owner_id)
+    )
+    count, max_id, versions, updated_at = result.one()
+    return f"{count}.{max_id or 0}.{versions}.{updated_at}"
+
+
+async def _bump_many(session: AsyncSession, rows: list[dict]) -> None:
+    # Executemany UPDATE by primary key that also bumps the version; rows are grouped by their column set.
+    groups: dict[tuple, list[dict]] = {}
+    for row in rows:
+        columns = tuple(sorted(key for key in row if key != "id"))
+        groups.setdefault(columns, []).append({"b_id": row["id"], **{f"b_{key}": row[key] for key in columns}})
+    table_ = Resume.__table__
+    for columns, params in groups.items():
+        stmt = (
+            update(table_)
+            .where(table_.c.id == bindparam("b_id"))
+            .values(**{key: bindparam(f"b_{key}") for key in columns},
+                    version=table_.c.version + 1, updated_at=datetime.utcnow())
+        )
+        await session.execute(stmt, params)
+
+
+async def delete_resume(session: AsyncSession, resume_id: int, owner_id: int,
+                        expected_versions: list[tuple[str, int]] | None = None) -> bool:
+    result = await session.execute(
+        delete(Resume).where(*_owned(resume_id, owner_id, expected_versions)).returning(Resume.id)
+    )
+    deleted = result.scalar_one_or_none() is not None
+    await session.commit()
+    await resume_fragment_cache.invalidate(owner_id)
+    return deleted
+
+
+async def apply_resume_batch(session: AsyncSession, owner_id: int, creates: list[ResumeCreate],
+                             updates: list[ResumeBatchUpdateItem], delete_ids: list[int]) -> list[dict]:
+    results = []
+    requested_ids = {item.id for item in updates} | set(delete_ids)
+    owned_ids = set()
+    if requested_ids:
+        owned = await session.execute(
+            select(Resume.id).where(Resume.owner_id == owner_id, Resume.id.in_(requested_ids))
+        )
+        owned_ids = set(owned.scalars().all())
+
+    if creates:
+        rows = [{"title": item.title, "description": item.description, "owner_id": owner_id} for item in creates]
+        if session.get_bind().dialect.name == "sqlite":
+            # SQLite has no insert sentinel, so sort_by_parameter_order would send one INSERT per row. A single
+            # multi-row INSERT hands out rowids in VALUES order, so sorting the returned ids restores it.
+            created = await session.execute(insert(Resume).returning(Resume.id), rows)
+            created_ids = sorted(created.scalars().all())
+        else:
+            created = await session.execute(insert(Resume).returning(Resume.id, sort_by_parameter_order=True), rows)
+            created_ids = created.scalars().all()
+        for index, resume_id in enumerate(created_ids):
+            results.append({"op": "create", "index": index, "id": resume_id, "status": 201})
+
+    update_rows = []
+    for index, item in enumerate(updates):
+        if item.id not in owned_ids:
+            results.append({"op": "update", "index": index, "id": item.id, "status": 404, "detail": "Resume not found"})
+            continue
+        values = item.model_dump(exclude_unset=True)
+        if len(values) > 1:
+            update_rows.append(values)
+        results.append({"op": "update", "index": index, "id": item.id, "status": 200})
+    if update_rows:
+        await _bump_many(session, update_rows)
+
+    for index, resume_id in enumerate(delete_ids):
+        found = resume_id in owned_ids
+        results.append({"op": "delete", "index": index, "id": resume_id, "status": 204 if found else 404,
+                        "detail": None if found else "Resume not found"})
+    owned_delete_ids = owned_ids.intersection(delete_ids)
+    if owned_delete_ids:
+        await session.execute(delete(Resume).where(Resume.id.in_(owned_delete_ids)))
+
     await session.commit()
+    await resume_fragment_cache.invalidate(owner_id)
+    return results
 
 
-async def improve_resume(session: AsyncSession, resume: Resume) -> Resume:
-    if resume.description and "[Improved]" in resume.description:
-        pass
+async def import_resumes(session: AsyncSession, owner_id: int, items: list[ResumeCreate]) -> int:
+    # One chunk, one transaction: COPY on asyncpg, a batched executemany INSERT elsewhere.
+    if not items:
+        return 0
+    connection = await session.connection()
+    if connection.dialect.driver == "asyncpg":
+        raw = await connection.get_raw_connection()
+        now = datetime.utcnow()
+        await raw.driver_connection.copy_records_to_table(
+            Resume.__tablename__, columns=["title", "description", "owner_id", "version", "updated_at", "incarnation"],
+            records=[(item.title, item.description, owner_id, 1, now, new_incarnation()) for item in items],
+        )
     else:
-        resume.description += (" Умение работать в режиме многозадачности и высокие аналитические"
-                               " способности позволяют мне эффективно работать с большими объёмами информации, "
-                               "быстро находить качественные решения сложных задач. [Improved]")
-    session.add(resume)
+        # Core executemany with one cached statement; a literal VALUES list would be recompiled for every chunk.
+        await session.execute(
+            insert(Resume.__table__),
+            [{"title": item.title, "description": item.description, "owner_id": owner_id} for item in items],
+        )
     await session.commit()
-    await session.refresh(resume)
-    return resume
+    await resume_fragment_cache.invalidate(owner_id)
+    return len(items)
+
+
+async def get_resumes_by_ids(session: AsyncSession, resume_ids: list[int]) -> list[Resume]:
+    result = await session.execute(select(Resume).where(Resume.id.in_(resume_ids)))
+    return list(result.scalars().all())
+
+
+async def update_descriptions(session: AsyncSession, descriptions: dict[int, str], read_versions: dict[int, int],
+                              owner_ids: set[int]) -> set[int]:
+    # Only rows still at the version the description was computed from are written, so an edit made while the
+    # improvement ran is never overwritten. Returns the ids that were updated.
+    if not descriptions:
+        return set()
+    result = await session.execute(
+        update(Resume)
+        .where(or_(*(and_(Resume.id == resume_id, Resume.version == read_versions[resume_id])
+                     for resume_id in descriptions)))
+        .values(description=case(descriptions, value=Resume.id), version=Resume.version + 1,
+                updated_at=datetime.utcnow())
+        .returning(Resume.id)
+        .execution_options(synchronize_session=False)
+    )
+    updated = set(result.scalars().all())
+    await session.commit()
+    if updated:
+        await resume_fragment_cache.invalidate(*owner_ids)
+    return updated
@@ -1,17 +1,41 @@
 import hashlib
+from typing import AsyncIterator
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert, func
 from sqlalchemy.engine import Result
+from sqlalchemy.exc import IntegrityError
 
-from app_v1.auth.service.jwt_service import get_password_hash
+from app_v1.auth.service.jwt_service import get_password_hash_async, invalidate_principal
 from app_v1.models.user import User
+from app_v1.repositories.refresh_token_repository import revoke_user_refresh_tokens
 from app_v1.schemas.user import UserCreate, UserUpdate, UserUpdatePartial
 
 
-async def get_users(session: AsyncSession) -> list[User]:
+class EmailAlreadyRegistered(ValueError):
+    pass
+
+
+async def get_users(session: AsyncSession, limit: int | None = None,
+                    after_id: int | None = None) -> tuple[list[User], int | None]:
     stmt = select(User).order_by(User.id)
+    if after_id is not None:
+        stmt = stmt.where(User.id > after_id)
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
     result: Result = await session.execute(stmt)
-    return list(result.scalars().all())
+    users = list(result.scalars().all())
+    if limit is None or len(users) <= limit:
+        return users, None
+    users = users[:limit]
+    return users, users[-1].id
+
+
+async def stream_users(session: AsyncSession, batch_size: int = 500) -> AsyncIterator[User]:
+    stmt = select(User).order_by(User.id).execution_options(yield_per=batch_size)
+    result = await session.stream_scalars(stmt)
+    async for user in result:
+        yield user
 
 
 async def get_user_by_id(session: AsyncSession, user_id: int) -> User | None:
@@ -19,32 +43,56 @@ async def get_user_by_id(session: AsyncSession, user_id: int) -> User | None:
 
 
 async def create_user(session: AsyncSession, user_in: UserCreate) -> User:
-    hashed_password = get_password_hash(user_in.password)
-    db_user = User(
-        name=user_in.name,
-        email=user_in.email,
-        password=hashed_password,
-    )
-    session.add(db_user)
-    await session.commit()
-    await session.refresh(db_user)
+    hashed_password = await get_password_hash_async(user_in.password)
+    try:
+        result = await session.execute(
+            insert(User)
+            .values(name=user_in.name, email=user_in.email, password=hashed_password)
+            .returning(User)
+        )
+        db_user = result.scalar_one()
+        await session.commit()
+    except IntegrityError:
+        # ux_users_email_lower: the same address in any letter case, also when a concurrent request won.
+        await session.rollback()
+        raise EmailAlreadyRegistered(user_in.email)
     return db_user
 
 
 async def get_user_by_email(session: AsyncSession, email: str) -> User | None:
-    result = await session.execute(select(User).where(User.email == email))
+    # Both sides go through the database's lower() so that the lookup folds case exactly like the unique index;
+    # Python's str.lower() folds non-ASCII letters that SQLite's lower() leaves alone.
+    result = await session.execute(select(User).where(func.lower(User.email) == func.lower(email)))
     return result.scalars().first()
 
 
 async def update_user(session: AsyncSession, user: User, user_update: UserUpdate | UserUpdatePartial,
                       partial: bool = False) -> User:
+    old_email = user.email
     for key, value in user_update.model_dump(exclude_unset=partial).items():
         setattr(user, key, value)
-    await session.commit()
-    await session.refresh(user)
+    new_email = user.email
+    try:
+        if new_email != old_email:
+            # Refresh tokens carry the email they were issued for; a changed email ends every session.
+            await revoke_user_refresh_tokens(session, user.id)
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise EmailAlreadyRegistered(new_email)
+    await invalidate_principal(old_email, user.email)
     return user
 
 
+async def update_password_hash(session: AsyncSession, user: User, hashed_password: str) -> None:
+    user.password = hashed_password
+    await session.commit()
+    await invalidate_principal(user.email)
+
+
 async def delete_user(session: AsyncSession, user: User) -> None:
+    email = user.email
+    await revoke_user_refresh_tokens(session, user.id)
     await session.delete(user)
     await session.commit()
+    await invalidate_principal(email)
@@ -0,0 +1,15 @@
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict
+
+JobStatus = Literal["queued", "running", "done", "failed"]
+
+
+class ImprovementJobRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: str
+    resume_id: int
+    owner_id: int
+    status: JobStatus
+    description: str | None = None
+    error: str | None = None
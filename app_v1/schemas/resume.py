@@ -1,9 +1,12 @@
-from pydantic import BaseModel, ConfigDict
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 
 class ResumeBase(BaseModel):
-    title: str
-    description: str
+    # Same limits as the columns, so that an overlong field is a validation error and not a database one.
+    title: str = Field(max_length=50)
+    description: str = Field(max_length=400)
 
 
 class ResumeCreate(ResumeBase):
@@ -15,15 +18,84 @@ class ResumeRead(BaseModel):
     title: str
     description: str
     owner_id: int
+    version: int
 
     class Config:
         from_attributes = True
 
 
+class ResumeSearchHit(ResumeRead):
+    rank: float
+
+
+class ResumeListItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    title: str | None = None
+    description: str | None = None
+    owner_id: int | None = None
+    version: int | None = None
+
+
+class ResumePage(BaseModel):
+    items: list[ResumeListItem]
+    next_cursor: str | None = None
+
+
 class ResumeUpdate(ResumeBase):
     pass
 
 
 class ResumeUpdatePartial(ResumeBase):
-    title: str | None = None
-    description: str | None = None
+    title: str | None = Field(None, max_length=50)
+    description: str | None = Field(None, max_length=400)
+
+    @field_validator("title", "description")
+    @classmethod
+    def not_null(cls, value: str | None) -> str:
+        # Omitting a field leaves it unchanged; an explicit null would hit the NOT NULL title column, or store a
+        # description that ResumeRead cannot return.
+        if value is None:
+            raise ValueError("may not be null")
+        return value
+
+
+class ResumeBatchUpdateItem(ResumeUpdatePartial):
+    id: int
+
+
+class ResumeBatch(BaseModel):
+    create: list[ResumeCreate] = []
+    update: list[ResumeBatchUpdateItem] = []
+    delete: list[int] = []
+
+    @model_validator(mode="after")
+    def no_update_of_deleted(self) -> "ResumeBatch":
+        overlap = {item.id for item in self.update} & set(self.delete)
+        if overlap:
+            raise ValueError(f"ids both updated and deleted: {sorted(overlap)}")
+        return self
+
+
+class ResumeBatchItemResult(BaseModel):
+    op: Literal["create", "update", "delete"]
+    index: int
+    id: int | None = None
+    status: int
+    detail: str | None = None
+
+
+class ResumeBatchResult(BaseModel):
+    results: list[ResumeBatchItemResult]
+
+
+class ResumeImportError(BaseModel):
+    row: int
+    detail: str
+
+
+class ResumeImportReport(BaseModel):
+    imported: int
+    failed: int
+    batches: int
+    errors: list[ResumeImportError]
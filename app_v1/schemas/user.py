@@ -38,3 +38,8 @@ class UserLogin(BaseModel):
 class User(UserBase):
     model_config = ConfigDict(from_attributes=True)
     id: int
+
+
+class UserPage(BaseModel):
+    items: list[User]
+    next_cursor: str | None = None
@@ -0,0 +1,194 @@
+"""Load benchmark for the main endpoints at several data sizes and concurrency levels.
+
+Drives the real main:app in-process through httpx's ASGI transport against a throwaway aiosqlite database.
+Every data size gets its own user owning that many resumes, so list/get/index always run against an owner
+with exactly 10, 1k or 100k rows. For each scenario it prints p50/p95/p99 latency and requests per second:
+
+    python benchmarks/bench_endpoints.py --sizes 10,1000,100000 --concurrency 1,10,50 --requests 200
+
+Results can be saved and later compared; the comparison exits with status 1 when any scenario's p95 grows or
+its throughput drops by more than --threshold:
+
+    python benchmarks/bench_endpoints.py --save baseline.json
+    python benchmarks/bench_endpoints.py --compare baseline.json --threshold 0.2
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SCENARIOS = ("login", "list", "get", "create", "update", "delete", "index", "improve")
+
+
+def prepare_env(bcrypt_rounds: int) -> None:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    os.environ["DB_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ["JWT_PRIVATE_KEY"] = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                      serialization.NoEncryption()).decode()
+    os.environ["JWT_PUBLIC_KEY"] = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    os.environ["BCRYPT_ROUNDS"] = str(bcrypt_rounds)
+    os.environ.setdefault("METRICS_ENABLED", "false")
+    # The login scenario replays one account far faster than the login limiter allows.
+    os.environ.setdefault("LOGIN_RATE_LIMIT_ENABLED", "false")
+
+
+class Owner:
+    def __init__(self, size: int, email: str, token: str, resume_ids: list[int]):
+        self.size = size
+        self.email = email
+        self.token = token
+        self.resume_ids = resume_ids
+        self.created: list[int] = []
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+async def seed(client, size: int) -> Owner:
+    from app_v1.core import settings
+
+    email = f"bench{size}@example.com"
+    await client.post("/auth/register", json={"name": "bench", "email": email, "password": "pw"})
+    login = await client.post("/auth/login", data={"username": email, "password": "pw"})
+    owner = Owner(size, email, login.json()["access_token"], [])
+    for start in range(0, size, settings.batch_max_items):
+        items = [{"title": f"Resume {n}", "description": "Опыт работы с Python и FastAPI. " * 6}
+                 for n in range(start, min(size, start + settings.batch_max_items))]
+        response = await client.post("/resumes/batch", json={"create": items}, headers=owner.headers)
+        owner.resume_ids.extend(result["id"] for result in response.json()["results"])
+    return owner
+
+
+def request_for(scenario: str, owner: Owner, n: int) -> tuple[str, str, dict]:
+    resume_id = random.choice(owner.resume_ids)
+    if scenario == "login":
+        return "POST", "/auth/login", {"data": {"username": owner.email, "password": "pw"}}
+    if scenario == "list":
+        return "GET", "/resumes/", {"headers": owner.headers}
+    if scenario == "get":
+        return "GET", f"/resumes/{resume_id}", {"headers": owner.headers}
+    if scenario == "create":
+        return "POST", "/resumes/", {"headers": owner.headers,
+                                     "json": {"title": f"Created {n}", "description": "Новое резюме"}}
+    if scenario == "update":
+        return "PATCH", f"/resumes/{resume_id}", {"headers": owner.headers, "json": {"title": f"Updated {n}"}}
+    if scenario == "delete":
+        return "DELETE", f"/resumes/{owner.created.pop()}", {"headers": owner.headers}
+    if scenario == "index":
+        return "GET", "/index", {"cookies": {"access_token": owner.token}}
+    return "POST", f"/resumes/resume/{resume_id}/improve", {"headers": owner.headers}
+
+
+async def run_scenario(client, scenario: str, owner: Owner, concurrency: int, requests: int) -> dict:
+    if scenario == "delete":
+        requests = min(requests, len(owner.created))
+    counter = itertools.count()
+    timings: list[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        while (n := next(counter)) < requests:
+            method, url, kwargs = request_for(scenario, owner, n)
+            cookies = kwargs.pop("cookies", None)
+            if cookies:
+                client.cookies.update(cookies)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            timings.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+            elif scenario == "create":
+                owner.created.append(response.json()["id"])
+
+    began = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - began
+    if len(timings) < 2:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "rps": 0.0, "errors": errors}
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return {"p50": cuts[49] * 1000, "p95": cuts[94] * 1000, "p99": cuts[98] * 1000,
+            "rps": len(timings) / elapsed, "errors": errors}
+
+
+async def run(sizes: list[int], levels: list[int], requests: int, scenarios: list[str]) -> dict:
+    import httpx
+    from main import app
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for size in sizes:
+                seeded = time.perf_counter()
+                owner = await seed(client, size)
+                print(f"{size} resumes (seeded in {time.perf_counter() - seeded:.1f} s)")
+                print(f"  {'scenario':8} {'conc':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} errors")
+                for concurrency in levels:
+                    for scenario in scenarios:
+                        result = await run_scenario(client, scenario, owner, concurrency, requests)
+                        results[f"{scenario}@{size}@c{concurrency}"] = result
+                        print(f"  {scenario:8} {concurrency:4} {result['p50']:8.2f} {result['p95']:8.2f} "
+                              f"{result['p99']:8.2f} {result['rps']:8.1f} {result['errors']}")
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for key, base in baseline.items():
+        current = results.get(key)
+        if current is None:
+            continue
+        if base["p95"] and current["p95"] > base["p95"] * (1 + threshold):
+            regressions.append(f"{key}: p95 {base['p95']:.2f} -> {current['p95']:.2f} ms")
+        if base["rps"] and current["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{key}: {base['rps']:.1f} -> {current['rps']:.1f} req/s")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,1000,100000")
+    parser.add_argument("--concurrency", default="1,10,50")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and concurrency level")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", type=Path, help="write results as a JSON baseline")
+    parser.add_argument("--compare", type=Path, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    prepare_env(args.bcrypt_rounds)
+    scenarios = [name for name in args.scenarios.split(",") if name in SCENARIOS]
+    results = asyncio.run(run([int(size) for size in args.sizes.split(",")],
+                              [int(level) for level in args.concurrency.split(",")], args.requests, scenarios))
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2))
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
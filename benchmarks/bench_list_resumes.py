@@ -0,0 +1,82 @@
+"""Before/after benchmark for GET /resumes/ with 1k resumes.
+
+Runs the real app in-process over ASGI against a throwaway SQLite database and compares the default
+FastAPI serialization with fast_json_responses, with and without gzip:
+
+    python benchmarks/bench_list_resumes.py --resumes 1000 --requests 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def prepare_env(resumes: int) -> None:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    os.environ["DB_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ["JWT_PRIVATE_KEY"] = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                      serialization.NoEncryption()).decode()
+    os.environ["JWT_PUBLIC_KEY"] = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    os.environ["PAGE_SIZE_MAX"] = str(resumes)
+    os.environ["BCRYPT_ROUNDS"] = "4"
+
+
+async def run(resumes: int, requests: int) -> None:
+    import httpx
+    from main import app
+    from app_v1.core import settings
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post("/auth/register", json={"name": "bench", "email": "bench@example.com", "password": "pw"})
+            login = await client.post("/auth/login", data={"username": "bench@example.com", "password": "pw"})
+            headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+            items = [{"title": f"Resume {n}", "description": "Опыт работы с Python и FastAPI. " * 6}
+                     for n in range(resumes)]
+            for start in range(0, resumes, settings.batch_max_items):
+                await client.post("/resumes/batch", json={"create": items[start:start + settings.batch_max_items]},
+                                  headers=headers)
+
+            print(f"GET /resumes/?limit={resumes}, {requests} requests")
+            for fast in (False, True):
+                for encoding in ("identity", "gzip"):
+                    settings.fast_json_responses = fast
+                    request_headers = {**headers, "Accept-Encoding": encoding}
+                    url = f"/resumes/?limit={resumes}"
+                    await client.get(url, headers=request_headers)
+                    timings = []
+                    size = 0
+                    for _ in range(requests):
+                        started = time.perf_counter()
+                        response = await client.get(url, headers=request_headers)
+                        timings.append((time.perf_counter() - started) * 1000)
+                        size = int(response.headers.get("content-length", len(response.content)))
+                    timings.sort()
+                    print(f"  fast_json={str(fast):5} encoding={encoding:8} "
+                          f"p50={statistics.median(timings):7.2f} ms  p95={timings[int(len(timings) * 0.95) - 1]:7.2f} ms  "
+                          f"size={size} B")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resumes", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    prepare_env(args.resumes)
+    asyncio.run(run(args.resumes, args.requests))
+
+
+if __name__ == "__main__":
+    main()
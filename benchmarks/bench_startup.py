@@ -0,0 +1,83 @@
+"""Startup-time benchmark for the app in each DB_STARTUP_SCHEMA mode.
+
+Every run is a fresh interpreter, like a worker restarting during a deploy. It reports the wall time of the
+whole process, the time to import main and the time the startup handlers take. The SQLite database is
+migrated to the alembic head first so that the "check" mode passes:
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+MODES = ("create_all", "check", "skip")
+
+
+def prepare_env() -> dict:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return {
+        **os.environ,
+        "DB_URL": f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db",
+        "JWT_PRIVATE_KEY": key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                             serialization.NoEncryption()).decode(),
+        "JWT_PUBLIC_KEY": key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode(),
+    }
+
+
+def child() -> None:
+    import asyncio
+
+    sys.path.insert(0, str(ROOT))
+    started = time.perf_counter()
+    from main import app
+    imported = time.perf_counter()
+
+    async def startup() -> float:
+        begin = time.perf_counter()
+        async with app.router.lifespan_context(app):
+            return time.perf_counter() - begin
+
+    print(json.dumps({"import": imported - started, "startup": asyncio.run(startup())}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    env = prepare_env()
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=ROOT, env=env, check=True,
+                   capture_output=True)
+    print(f"{args.runs} runs per mode, medians in ms")
+    for mode in MODES:
+        timings = {"process": [], "import": [], "startup": []}
+        for _ in range(args.runs):
+            began = time.perf_counter()
+            result = subprocess.run([sys.executable, __file__, "--child"], cwd=ROOT,
+                                    env={**env, "DB_STARTUP_SCHEMA": mode}, check=True, capture_output=True,
+                                    text=True)
+            timings["process"].append(time.perf_counter() - began)
+            child_timings = json.loads(result.stdout.strip().splitlines()[-1])
+            timings["import"].append(child_timings["import"])
+            timings["startup"].append(child_timings["startup"])
+        print(f"  {mode:10} " + "  ".join(f"{name}={statistics.median(values) * 1000:7.1f}"
+                                          for name, values in timings.items()))
+
+
+if __name__ == "__main__":
+    main()
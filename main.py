@@ -1,48 +1,72 @@
 from pathlib import Path
-import uvicorn
 from fastapi import FastAPI
-from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from starlette.responses import RedirectResponse
 
 from app_v1.controllers.user_controller import router as user_router
 from app_v1.controllers.resume_controller import router as resume_router
 from app_v1.auth.controller.jwt_controller import router as jwt_router
+from app_v1.auth.service.cookie_refresh import CookieRefreshMiddleware
 from app_v1.controllers.web_resume_controller import router as web_router
-from app_v1.core.db_helper import DataBaseHelper
-from app_v1.models.base import Base
+from app_v1.controllers.metrics_controller import router as metrics_router
+from app_v1.core.compression import CompressionMiddleware
+from app_v1.core.db_helper import db_helper
+from app_v1.core.metrics import MetricsMiddleware
+from app_v1.core.query_budget import QueryBudgetMiddleware, query_budget, routes_without_budget
+from app_v1.core.shared_cache import invalidation_bus
+from app_v1.core.startup import prepare_schema
+from app_v1.core.templates import warm_templates
+from app_v1.jobs import improvement_workers
 from app_v1.core.config import settings
 
 
-db_helper = DataBaseHelper(
-    url=settings.db_url,
-    echo=settings.db_echo
-)
-
 app = FastAPI(title="FastAPI V1")
+if settings.compression_enabled:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_size,
+                       gzip_level=settings.compression_gzip_level, brotli_quality=settings.compression_brotli_quality)
+# Inside the metrics and query budget middleware, so a silent refresh is timed and counted with its request.
+app.add_middleware(CookieRefreshMiddleware, refresh_before=settings.jwt_cookie_refresh_seconds)
 app.include_router(router=user_router, prefix='/users')
 app.include_router(router=resume_router, prefix='/resumes')
 app.include_router(router=jwt_router, prefix='/auth')
 app.include_router(router=web_router)
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router=metrics_router)
+if settings.query_budget_mode != "off":
+    app.add_middleware(QueryBudgetMiddleware, mode=settings.query_budget_mode,
+                       repeat_threshold=settings.query_repeat_threshold)
 
 BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "static"
-TEMPLATES_DIR = BASE_DIR / "templates"
 
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
-templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
 
 @app.on_event("startup")
 async def on_startup():
-    async with db_helper.engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if settings.query_budget_mode == "strict" and routes_without_budget(app.routes):
+        raise RuntimeError(f"Routes without a query budget: {routes_without_budget(app.routes)}")
+    await prepare_schema(db_helper.engine, settings.db_startup_schema)
+    await db_helper.prewarm(settings.db_pool_prewarm)
+    warm_templates()
+    await improvement_workers.start()
+    await invalidation_bus.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await invalidation_bus.stop()
+    await improvement_workers.stop()
 
 
 @app.get("/")
+@query_budget(0)
 async def root():
     return RedirectResponse(url="/login")
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("main:app", reload=True)
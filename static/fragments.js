@@ -0,0 +1,55 @@
+// Submits resume forms in the background and swaps in the changed card instead of reloading /index.
+document.addEventListener("submit", async (event) => {
+    const form = event.target;
+    const mode = form.dataset.fragment;
+    if (!mode) {
+        return;
+    }
+    event.preventDefault();
+    const response = await fetch(form.action, {
+        method: "POST",
+        body: new FormData(form),
+        headers: {"X-Fragment": "1"},
+    });
+    if (response.redirected || !response.ok) {
+        window.location = response.redirected ? response.url : "/index";
+        return;
+    }
+    const html = await response.text();
+    if (mode === "append") {
+        // The list is sorted by ascending id, so a new resume goes last: after this page's cards, or nowhere
+        // when it lands on a later page.
+        const list = document.getElementById("resume-list");
+        const pagination = list.querySelector(".pagination");
+        if (!list.querySelector('.pagination a[href*="cursor="]')) {
+            if (pagination) {
+                pagination.insertAdjacentHTML("beforebegin", html);
+            } else {
+                list.insertAdjacentHTML("beforeend", html);
+            }
+        }
+        form.reset();
+    } else {
+        const card = form.closest(".resume-card");
+        if (mode === "remove") {
+            card.remove();
+        } else {
+            card.outerHTML = html;
+        }
+    }
+    scheduleRefresh();
+});
+
+function scheduleRefresh() {
+    document.querySelectorAll(".resume-card[data-refresh]").forEach((card) => {
+        const url = card.dataset.refresh;
+        delete card.dataset.refresh;
+        setTimeout(async () => {
+            const response = await fetch(url);
+            if (response.ok) {
+                card.outerHTML = await response.text();
+                scheduleRefresh();
+            }
+        }, 1000);
+    });
+}
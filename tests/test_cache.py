@@ -0,0 +1,135 @@
+"""Two Cache/OwnerScopedCache pairs, each with its own InvalidationBus, play two workers sharing one store.
+
+The store is the in-process LocalRedis, or a real server from CACHE_REDIS_URL.
+"""
+import asyncio
+import os
+import uuid
+
+import pytest
+
+from app_v1.core.cache import Cache, OwnerScopedCache
+from app_v1.core.shared_cache import InvalidationBus, build_shared_store
+
+pytestmark = pytest.mark.anyio
+
+
+async def wait_for(condition, timeout: float = 2.0) -> bool:
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        await asyncio.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+async def workers():
+    store = build_shared_store(os.environ.get("CACHE_REDIS_URL") or "local://")
+    channel = f"cache-test-{uuid.uuid4().hex}"
+    namespace = f"test-{uuid.uuid4().hex[:8]}"
+    buses = [InvalidationBus(store, channel), InvalidationBus(store, channel)]
+    values = [Cache(namespace, maxsize=100, ttl=60, store=store, bus=bus, lock_ms=1000) for bus in buses]
+    fragments = [OwnerScopedCache(f"{namespace}-fragment", max_owners=10, max_entries_per_owner=10, ttl=60,
+                                  store=store, bus=bus) for bus in buses]
+    for bus in buses:
+        await bus.start()
+    try:
+        yield values, fragments
+    finally:
+        for bus in buses:
+            await bus.stop()
+
+
+def counting_loader():
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.05)
+        return {"loaded": len(loads)}
+
+    return load, loads
+
+
+async def test_concurrent_misses_on_both_workers_load_once(workers):
+    values, _ = workers
+    load, loads = counting_loader()
+    results = await asyncio.gather(*(values[index % 2].get_or_load("key", load) for index in range(20)))
+    assert len(loads) == 1
+    assert all(result == {"loaded": 1} for result in results)
+
+    await values[0].get_or_load("key", load)
+    assert len(loads) == 1 and values[1].local.get("key") is not None
+
+
+async def test_invalidation_reaches_the_other_worker(workers):
+    values, _ = workers
+    load, _ = counting_loader()
+    await asyncio.gather(values[0].get_or_load("key", load), values[1].get_or_load("key", load))
+    await values[0].invalidate("key")
+    assert await wait_for(lambda: values[1].local.get("key") is None)
+    assert await values[1].get("key") is None
+
+
+@pytest.mark.parametrize("invalidator", [0, 1], ids=["same worker", "other worker"])
+async def test_load_overlapping_an_invalidation_is_not_kept(workers, invalidator):
+    values, _ = workers
+
+    async def slow_load():
+        await asyncio.sleep(0.05)
+        return {"stale": True}
+
+    loading = asyncio.create_task(values[0].get_or_load("key", slow_load))
+    await asyncio.sleep(0.01)
+    await values[invalidator].invalidate("key")
+    await loading
+    await wait_for(lambda: not values[0]._loading)
+    assert values[0].local.get("key") is None
+    assert await values[1].get("key") is None
+
+
+async def test_fragment_shared_and_invalidated_across_workers(workers):
+    _, fragments = workers
+    _, token = await fragments[0].get(1, ("list", None))
+    await fragments[0].set(1, ("list", None), "<ul></ul>", token)
+    html, _ = await fragments[1].get(1, ("list", None))
+    assert html == "<ul></ul>" and fragments[1].shared_hits == 1
+
+    await fragments[1].invalidate(1)
+    assert await wait_for(lambda: fragments[0]._owners.get(1) is None)
+    html, _ = await fragments[0].get(1, ("list", None))
+    assert html is None
+
+
+async def test_fragment_rendered_before_an_invalidation_is_not_cached(workers):
+    _, fragments = workers
+    _, token = await fragments[0].get(2, ("list", None))
+    await fragments[1].invalidate(2)
+    await wait_for(lambda: fragments[0].remote_invalidations >= 1)
+    await fragments[0].set(2, ("list", None), "<ul>stale</ul>", token)
+    assert (await fragments[0].get(2, ("list", None)))[0] is None
+    assert (await fragments[1].get(2, ("list", None)))[0] is None
+
+
+async def test_fragment_entries_per_owner_capped_in_shared_tier(workers):
+    _, fragments = workers
+    for cursor in range(25):
+        _, token = await fragments[0].get(3, ("list", cursor))
+        await fragments[0].set(3, ("list", cursor), "<ul></ul>", token)
+    fragments[1].clear()
+    stored = [(await fragments[1].get(3, ("list", cursor)))[0] for cursor in range(25)]
+    assert sum(html is not None for html in stored) <= fragments[0].max_entries_per_owner
+
+
+async def test_fragment_entries_expire_independently():
+    store = build_shared_store(os.environ.get("CACHE_REDIS_URL") or "local://")
+    # Writing a newer entry must not extend the older one.
+    cache = OwnerScopedCache(f"test-{uuid.uuid4().hex[:8]}", max_owners=10, max_entries_per_owner=10, ttl=0.3,
+                             store=store)
+    for cursor in (1, 2):
+        _, token = await cache.get(4, ("list", cursor))
+        await cache.set(4, ("list", cursor), "<ul></ul>", token)
+        await asyncio.sleep(0.2)
+    cache.clear()
+    assert (await cache.get(4, ("list", 1)))[0] is None
+    assert (await cache.get(4, ("list", 2)))[0] is not None
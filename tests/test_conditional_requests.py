@@ -0,0 +1,68 @@
+"""ETags of the resume list and of single resumes, replayed through If-None-Match and If-Match after writes."""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def create(client, user, title: str) -> int:
+    response = await client.post("/resumes/", json={"title": title, "description": ""}, headers=user["headers"])
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+async def list_etag(client, user) -> str:
+    return (await client.get("/resumes/", headers=user["headers"])).headers["ETag"]
+
+
+async def list_status(client, user, etag: str) -> int:
+    return (await client.get("/resumes/", headers={**user["headers"], "If-None-Match": etag})).status_code
+
+
+async def test_unchanged_list_is_not_modified(client, user):
+    await create(client, user, "A")
+    assert await list_status(client, user, await list_etag(client, user)) == 304
+
+
+@pytest.mark.parametrize("write", ["create", "update", "delete", "delete then create"])
+async def test_list_etag_changes_with_every_write(client, user, write):
+    first, second = await create(client, user, "A"), await create(client, user, "B")
+    etag = await list_etag(client, user)
+    if write == "create":
+        await create(client, user, "C")
+    elif write == "update":
+        await client.patch(f"/resumes/{first}", json={"title": "A2"}, headers=user["headers"])
+    elif write == "delete":
+        await client.delete(f"/resumes/{second}", headers=user["headers"])
+    else:
+        # SQLite hands the deleted newest id out again, so count and max(id) come back the same.
+        await client.delete(f"/resumes/{second}", headers=user["headers"])
+        await create(client, user, "C")
+    assert await list_status(client, user, etag) == 200
+
+
+async def test_resume_etag_of_deleted_resume_does_not_match_its_successor(client, user):
+    resume_id = await create(client, user, "Old")
+    etag = (await client.get(f"/resumes/{resume_id}", headers=user["headers"])).headers["ETag"]
+    await client.delete(f"/resumes/{resume_id}", headers=user["headers"])
+    # On SQLite this is usually the same id at version 1 again.
+    successor = await create(client, user, "New")
+
+    response = await client.get(f"/resumes/{successor}", headers={**user["headers"], "If-None-Match": etag})
+    assert response.status_code == 200
+    response = await client.put(f"/resumes/{successor}", json={"title": "Overwrite", "description": ""},
+                                headers={**user["headers"], "If-Match": etag})
+    assert response.status_code == 412
+    assert (await client.get(f"/resumes/{successor}", headers=user["headers"])).json()["title"] == "New"
+
+
+async def test_if_match_with_current_etag_updates_and_stale_one_fails(client, user):
+    resume_id = await create(client, user, "A")
+    etag = (await client.get(f"/resumes/{resume_id}", headers=user["headers"])).headers["ETag"]
+    updated = await client.patch(f"/resumes/{resume_id}", json={"title": "B"},
+                                 headers={**user["headers"], "If-Match": etag})
+    assert updated.status_code == 200 and updated.headers["ETag"] != etag
+    stale = await client.delete(f"/resumes/{resume_id}", headers={**user["headers"], "If-Match": etag})
+    assert stale.status_code == 412
+    current = await client.delete(f"/resumes/{resume_id}",
+                                  headers={**user["headers"], "If-Match": updated.headers["ETag"]})
+    assert current.status_code == 204
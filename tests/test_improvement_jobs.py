@@ -0,0 +1,74 @@
+"""Improvement jobs write the improved description only over the version it was computed from."""
+import asyncio
+
+import pytest
+
+import app_v1.jobs.worker as worker
+from app_v1.core import db_helper
+from app_v1.jobs import improvement_cache, request_improvement
+from app_v1.jobs.cache import content_key
+from app_v1.repositories import resume_repository
+
+pytestmark = pytest.mark.anyio
+
+
+async def wait_for_job(client, user, job_id: str, timeout: float = 5.0) -> dict:
+    for _ in range(int(timeout / 0.05)):
+        job = (await client.get(f"/resumes/jobs/{job_id}", headers=user["headers"])).json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {job['status']} after {timeout}s")
+
+
+async def create(client, user, description: str) -> dict:
+    response = await client.post("/resumes/", json={"title": "Resume", "description": description},
+                                 headers=user["headers"])
+    return response.json()
+
+
+async def test_improvement_completes(client, user):
+    resume = await create(client, user, "plain text")
+    job = (await client.post(f"/resumes/resume/{resume['id']}/improve", headers=user["headers"])).json()
+    job = await wait_for_job(client, user, job["id"])
+    stored = (await client.get(f"/resumes/{resume['id']}", headers=user["headers"])).json()
+    assert job["status"] == "done"
+    assert stored["description"] == job["description"] and stored["version"] == resume["version"] + 1
+
+
+async def test_edit_during_improvement_is_not_overwritten(client, user, monkeypatch):
+    improve = worker.improve_descriptions
+    started = asyncio.Event()
+
+    async def slow_improve(items):
+        started.set()
+        await asyncio.sleep(0.3)
+        return await improve(items)
+
+    monkeypatch.setattr(worker, "improve_descriptions", slow_improve)
+    resume = await create(client, user, "old text")
+    job = (await client.post(f"/resumes/resume/{resume['id']}/improve", headers=user["headers"])).json()
+    await asyncio.wait_for(started.wait(), 5)
+    edited = await client.patch(f"/resumes/{resume['id']}", json={"description": "my edit"},
+                                headers=user["headers"])
+    assert edited.status_code == 200
+
+    job = await wait_for_job(client, user, job["id"])
+    stored = (await client.get(f"/resumes/{resume['id']}", headers=user["headers"])).json()
+    assert job["status"] == "failed" and job["error"].startswith("Superseded")
+    assert stored["description"] == "my edit" and stored["version"] == edited.json()["version"]
+
+
+async def test_cached_improvement_is_not_written_over_a_newer_version(client, user):
+    resume = await create(client, user, "cached text")
+    await improvement_cache.set_many({content_key("Resume", "cached text"): "cached text, improved"})
+    async with db_helper.session_factory() as session:
+        stale = await resume_repository.get_resume_by_id(session, resume["id"])
+    await client.patch(f"/resumes/{resume['id']}", json={"description": "my edit"}, headers=user["headers"])
+
+    async with db_helper.session_factory() as session:
+        job = await request_improvement(session, stale)
+    assert job.status == "queued"
+    stored = (await client.get(f"/resumes/{resume['id']}", headers=user["headers"])).json()
+    # The queued job may already have improved the edit, but the stale cached text never lands.
+    assert stored["description"].startswith("my edit")
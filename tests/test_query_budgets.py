@@ -0,0 +1,81 @@
+"""Every route called once with cold caches, within its @query_budget and without repeated statements.
+
+The app fixture runs in strict mode, which already refuses to start while any route lacks a budget and fails a
+request that goes over it.
+"""
+import re
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_every_route_within_budget(client, clear_caches):
+    async def call(method: str, url: str, **kwargs):
+        clear_caches()
+        response = await client.request(method, url, **kwargs)
+        assert "x-query-budget" in response.headers, f"{method} {url} matched no budgeted route"
+        return response
+
+    await call("GET", "/")
+    await call("GET", "/login")
+    await call("GET", "/register")
+    await call("POST", "/register", data={"name": "web", "email": "web@example.com", "password": "pw"})
+    login = await call("POST", "/login", data={"email": "web@example.com", "password": "pw"})
+    cookies = {"access_token": login.cookies["access_token"], "refresh_token": login.cookies["refresh_token"]}
+    await call("POST", "/auth/register", json={"name": "api", "email": "api@example.com", "password": "pw"})
+    login = await call("POST", "/auth/login", data={"username": "api@example.com", "password": "pw"})
+    auth = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    refreshed = await call("POST", "/auth/refresh", json={"refresh_token": login.json()["refresh_token"]})
+    await call("POST", "/auth/refresh", json={"refresh_token": login.json()["refresh_token"]})
+    await call("POST", "/auth/logout", json={"refresh_token": refreshed.json()["refresh_token"]})
+
+    created = await call("POST", "/resumes/", json={"title": "Python", "description": "FastAPI"}, headers=auth)
+    resume_id = created.json()["id"]
+    await call("POST", "/resumes/batch", headers=auth, json={
+        "create": [{"title": f"Resume {n}", "description": "SQLAlchemy"} for n in range(5)],
+        "update": [{"id": resume_id, "title": "Python developer"}]})
+    await call("GET", "/resumes/", headers=auth)
+    await call("GET", "/resumes/search?q=python", headers=auth)
+    for format in ("ndjson", "csv", "zip"):
+        await call("GET", f"/resumes/export?format={format}", headers=auth)
+    await call("GET", "/resumes/export/all", headers=auth)
+    await call("POST", "/resumes/import", headers={**auth, "Content-Type": "text/csv"},
+               content="title,description\nImported,CSV\n")
+    await call("POST", "/resumes/import", headers={**auth, "Content-Type": "application/x-ndjson"},
+               content='{"title": "Imported", "description": "NDJSON"}\n')
+    await call("GET", f"/resumes/{resume_id}", headers=auth)
+    await call("PUT", f"/resumes/{resume_id}", json={"title": "Backend", "description": "FastAPI"}, headers=auth)
+    await call("PATCH", f"/resumes/{resume_id}", json={"title": "Backend developer"}, headers=auth)
+    job = await call("POST", f"/resumes/resume/{resume_id}/improve", headers=auth)
+    await call("GET", f"/resumes/jobs/{job.json()['id']}", headers=auth)
+    await call("DELETE", f"/resumes/{resume_id}", headers=auth)
+
+    user = await call("POST", "/users/", json={"name": "user", "email": "user@example.com", "password": "pw"})
+    user_id = user.json()["id"]
+    await call("GET", "/users/")
+    await call("GET", "/users/?format=ndjson")
+    await call("GET", f"/users/{user_id}")
+    await call("PUT", f"/users/{user_id}", json={"name": "user", "email": "user2@example.com", "password": "pw2"})
+    await call("PATCH", f"/users/{user_id}", json={"name": "renamed"})
+    await call("DELETE", f"/users/{user_id}")
+
+    client.cookies.update(cookies)
+    client.cookies.delete("access_token")
+    await call("GET", "/index")
+    await call("POST", "/create_resume", data={"title": "Web", "description": "Form"})
+    card = await call("POST", "/create_resume", data={"title": "Web", "description": "Fragment"},
+                      headers={"X-Fragment": "1"})
+    web_id = int(re.search(r'id="resume-(\d+)"', card.text).group(1))
+    await call("GET", "/index")
+    await call("GET", "/fragments/resumes")
+    await call("GET", f"/fragments/resumes/{web_id}")
+    await call("POST", "/update_resume", data={"resume_id": web_id, "title": "Web 2", "description": "Form"})
+    await call("POST", "/update_resume_partial", data={"resume_id": web_id, "title": "Web 3"})
+    improved = await call("POST", "/improve_resume", data={"resume_id": web_id}, headers={"X-Fragment": "1"})
+    refresh = re.search(r'data-refresh="([^"]+)"', improved.text)
+    if refresh:
+        await call("GET", refresh.group(1))
+    await call("POST", f"/delete_resume/{web_id}")
+    await call("POST", "/logout")
+    await call("GET", "/metrics")
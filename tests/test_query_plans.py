@@ -0,0 +1,90 @@
+"""The SQL behind the list and auth paths reads "resumes" and "users" through an index, never a full scan.
+
+Each captured statement is EXPLAINed with its own parameters. On PostgreSQL sequential scans are disabled while
+explaining, so a tiny table still shows whether a usable index exists.
+"""
+import uuid
+
+import pytest
+from sqlalchemy import event
+
+from app_v1.auth.service.jwt_service import get_user_by_subject, principal_cache
+from app_v1.core import db_helper
+from app_v1.repositories import resume_repository, user_repository
+from app_v1.schemas.resume import ResumeCreate
+from app_v1.schemas.user import UserCreate
+
+pytestmark = pytest.mark.anyio
+
+HOT_TABLES = ("resumes", "users")
+
+
+def sqlite_full_scans(rows) -> list[str]:
+    # EXPLAIN QUERY PLAN says "SEARCH <table> USING INDEX ..." for index lookups and "SCAN <table>" otherwise.
+    return [row.detail for row in rows if row.detail.startswith(tuple(f"SCAN {table}" for table in HOT_TABLES))]
+
+
+def postgres_full_scans(plan: dict) -> list[str]:
+    scans = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in HOT_TABLES:
+        scans.append(f"Seq Scan on {plan['Relation Name']}")
+    for child in plan.get("Plans", []):
+        scans.extend(postgres_full_scans(child))
+    return scans
+
+
+async def full_scans(connection, statement: str, parameters) -> list[str]:
+    if connection.dialect.name == "postgresql":
+        await connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+        return postgres_full_scans(result.scalar()[0]["Plan"])
+    result = await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    return sqlite_full_scans(result.all())
+
+
+async def test_hot_queries_use_indexes(app):
+    prefix = uuid.uuid4().hex[:8]
+    async with db_helper.session_factory() as session:
+        owners = [await user_repository.create_user(
+            session, UserCreate(name="plan", email=f"Plan{n}-{prefix}@Example.com", password="pw"))
+            for n in range(3)]
+        await resume_repository.apply_resume_batch(
+            session, owners[0].id, [ResumeCreate(title=f"Resume {n}", description="Python") for n in range(20)],
+            [], [])
+
+    captured: list[tuple[str, str, object]] = []
+    label = ""
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((label, statement, parameters))
+
+    event.listen(db_helper.engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        async with db_helper.session_factory() as session:
+            owner_id = owners[0].id
+            for label, call in (
+                    ("list resumes", resume_repository.get_resumes(session, owner_id, limit=5)),
+                    ("list resumes after cursor", resume_repository.get_resumes(session, owner_id, limit=5,
+                                                                                after_id=5)),
+                    ("list resumes descending", resume_repository.get_resumes(session, owner_id, limit=5,
+                                                                              descending=True)),
+                    ("list resume fields", resume_repository.get_resumes(session, owner_id, limit=5,
+                                                                         fields=["title"])),
+                    ("collection version", resume_repository.get_collection_version(session, owner_id)),
+                    ("user by email", user_repository.get_user_by_email(session, f"plan1-{prefix}@example.com")),
+            ):
+                await call
+            principal_cache.clear()
+            label = "user by token subject"
+            await get_user_by_subject(session, f"PLAN2-{prefix}@example.com")
+    finally:
+        event.remove(db_helper.engine.sync_engine, "before_cursor_execute", capture)
+
+    assert {label for label, _, _ in captured} >= {"list resumes", "user by email", "user by token subject"}
+    scans = {}
+    async with db_helper.engine.connect() as connection:
+        for label, statement, parameters in captured:
+            found = await full_scans(connection, statement, parameters)
+            if found:
+                scans[label] = found
+    assert not scans
@@ -0,0 +1,129 @@
+"""Login limiter on both backends: the same attempts must be allowed and refused by each."""
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from app_v1.auth.service.rate_limit import (DatabaseRateLimitBackend, InMemoryRateLimitBackend, LimitRule,
+                                            LoginLimiter, account_key, admit)
+from app_v1.core import db_helper
+from app_v1.models import LoginThrottle
+
+pytestmark = pytest.mark.anyio
+
+# Refill is slow enough that no token comes back while a test runs.
+IP_RULE = LimitRule(burst=6, per_second=0.001, window_seconds=600, window_limit=100)
+ACCOUNT_RULE = LimitRule(burst=3, per_second=0.001, window_seconds=600, window_limit=100)
+
+
+@pytest.fixture(params=["memory", "database"])
+def limiter(request, app):
+    if request.param == "memory":
+        backend = InMemoryRateLimitBackend(max_keys=1000)
+    else:
+        backend = DatabaseRateLimitBackend(session_factory=db_helper.session_factory, idle_seconds=1200,
+                                           prune_every=1000)
+    return LoginLimiter(backend, IP_RULE, ACCOUNT_RULE)
+
+
+def unique(name: str) -> str:
+    return f"{name}-{uuid.uuid4().hex[:8]}"
+
+
+async def attempts(limiter: LoginLimiter, ip: str, account: str, count: int) -> list[bool]:
+    # True for every attempt that was let through to the password check.
+    return [not await limiter.check(ip, account) for _ in range(count)]
+
+
+async def test_account_locked_out_after_burst(limiter):
+    account = unique("user") + "@example.com"
+    assert await attempts(limiter, unique("ip"), account, 4) == [True, True, True, False]
+    # From another address too: the account bucket is what refused it.
+    assert await attempts(limiter, unique("ip"), account, 1) == [False]
+    assert await limiter.check(unique("ip"), account) > 0
+
+
+async def test_success_resets_the_account_but_not_the_address(limiter):
+    ip, account = unique("ip"), unique("user") + "@example.com"
+    assert await attempts(limiter, ip, account, 3) == [True] * 3
+    await limiter.succeeded(account)
+    assert await attempts(limiter, ip, account, 3) == [True] * 3
+    await limiter.succeeded(account)
+    # Six attempts used up the address's burst even though the account was reset in between.
+    assert await attempts(limiter, ip, account, 1) == [False]
+
+
+async def test_account_matches_regardless_of_case_and_spaces(limiter):
+    account = unique("user") + "@example.com"
+    allowed = [not await limiter.check(unique("ip"), variant)
+               for variant in (account, account.upper(), f"  {account} ", account)]
+    assert allowed == [True, True, True, False]
+
+
+async def test_refused_attempt_is_not_counted(limiter):
+    ip = unique("ip")
+    locked = unique("locked") + "@example.com"
+    assert await attempts(limiter, ip, locked, 4) == [True, True, True, False]
+    # The refused attempt did not take a token from the address: three more accounts still fit its burst.
+    assert await attempts(limiter, ip, unique("other"), 3) == [True] * 3
+    assert await attempts(limiter, ip, unique("other"), 1) == [False]
+
+
+async def test_disabled_limiter_allows_everything():
+    limiter = LoginLimiter(InMemoryRateLimitBackend(max_keys=10), IP_RULE, ACCOUNT_RULE, enabled=False)
+    assert await attempts(limiter, "ip", "user@example.com", 10) == [True] * 10
+
+
+def test_account_key_is_fixed_length_and_normalised():
+    assert account_key("User@Example.com ") == account_key("user@example.com")
+    assert account_key("a") != account_key("b")
+    assert len(account_key("x" * 5000)) == len(account_key("a")) <= LoginThrottle.id.type.length
+
+
+async def test_long_username_is_stored_under_its_hashed_key(app):
+    backend = DatabaseRateLimitBackend(session_factory=db_helper.session_factory, idle_seconds=1200,
+                                       prune_every=1000)
+    limiter = LoginLimiter(backend, IP_RULE, ACCOUNT_RULE)
+    username = unique("x" * 5000)
+    assert await limiter.check(unique("ip"), username) == 0
+    async with db_helper.session_factory() as session:
+        stored = await session.get(LoginThrottle, account_key(username))
+    assert stored is not None and stored.window_count == 1
+
+
+async def test_in_memory_backend_evicts_least_recently_used_keys():
+    backend = InMemoryRateLimitBackend(max_keys=2)
+    rule = LimitRule(burst=1, per_second=0.001, window_seconds=600, window_limit=100)
+    for key in ("a", "b", "c"):
+        assert await backend.hit([(key, rule)]) == (0.0, None)
+    assert backend.stats() == {"keys": 2, "max_keys": 2, "evictions": 1}
+    # "a" was evicted and starts from a full bucket again; "c" is still spent.
+    assert await backend.hit([("a", rule)]) == (0.0, None)
+    wait, key = await backend.hit([("c", rule)])
+    assert wait > 0 and key == "c"
+
+
+async def test_database_backend_prunes_idle_rows(app):
+    backend = DatabaseRateLimitBackend(session_factory=db_helper.session_factory, idle_seconds=0, prune_every=2)
+    rule = LimitRule(burst=3, per_second=0.001, window_seconds=600, window_limit=100)
+    idle, active = unique("idle"), unique("active")
+    await backend.hit([(idle, rule)])
+    # The second hit prunes: the first key has been idle since, the one just hit has not.
+    await backend.hit([(active, rule)])
+    async with db_helper.session_factory() as session:
+        kept = set((await session.execute(select(LoginThrottle.id).where(LoginThrottle.id.in_([idle, active]))))
+                   .scalars())
+    assert kept == {active}
+
+
+def test_sliding_window_limits_attempts_across_the_window():
+    rule = LimitRule(burst=100, per_second=100, window_seconds=60, window_limit=3)
+    state = None
+    for now in (0.0, 1.0, 2.0):
+        state, wait = admit(state, rule, now)
+        assert wait == 0
+    _, wait = admit(state, rule, 3.0)
+    assert 0 < wait <= 57
+    # Halfway through the next window half of the previous window's attempts still count.
+    _, wait = admit(state, rule, 90.0)
+    assert wait == 0
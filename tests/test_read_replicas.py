@@ -0,0 +1,104 @@
+"""Read routing between a primary and replicas, with one SQLite file per database.
+
+Each file holds a single row naming its database, so a route that reads it shows where the request went.
+"""
+import asyncio
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app_v1.core.db_helper import DataBaseHelper
+from app_v1.core.shared_cache import LocalRedis
+
+pytestmark = pytest.mark.anyio
+
+
+def database(directory: Path, name: str) -> str:
+    with sqlite3.connect(directory / f"{name}.db") as connection:
+        connection.execute("CREATE TABLE served_by (name TEXT)")
+        connection.execute("INSERT INTO served_by VALUES (?)", (name,))
+    return f"sqlite+aiosqlite:///{directory / name}.db"
+
+
+def build_helper(replicas: list[str], store=None, read_your_writes_seconds: float = 5) -> DataBaseHelper:
+    # Replica names get their own file; anything else is taken as a URL.
+    directory = Path(tempfile.mkdtemp())
+    replica_urls = [database(directory, name) if name.startswith("replica") else name for name in replicas]
+    return DataBaseHelper(url=database(directory, "primary"), replica_urls=replica_urls,
+                          read_your_writes_seconds=read_your_writes_seconds, replica_retry_seconds=30, store=store)
+
+
+def routing_app(helper: DataBaseHelper) -> FastAPI:
+    app = FastAPI()
+
+    async def served_by(session: AsyncSession = Depends(helper.session_dependency)) -> str:
+        return (await session.execute(text("SELECT name FROM served_by"))).scalar_one()
+
+    app.get("/read")(served_by)
+    app.post("/write")(served_by)
+    return app
+
+
+async def call(helper: DataBaseHelper, method: str, token: str) -> str:
+    transport = httpx.ASGITransport(app=routing_app(helper))
+    async with httpx.AsyncClient(transport=transport, base_url="http://replicas") as client:
+        response = await client.request(method, "/read" if method == "GET" else "/write",
+                                        headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_reads_go_to_replicas_round_robin():
+    helper = build_helper(["replica-a", "replica-b"])
+    served = [await call(helper, "GET", f"reader-{n}") for n in range(4)]
+    assert sorted(served) == ["replica-a", "replica-a", "replica-b", "replica-b"]
+
+
+async def test_writes_and_reads_in_the_same_request_use_the_primary():
+    helper = build_helper(["replica-a"])
+    assert await call(helper, "POST", "writer") == "primary"
+
+
+async def test_read_after_write_is_pinned_to_the_primary_for_that_client_only():
+    helper = build_helper(["replica-a"])
+    await call(helper, "POST", "writer")
+    assert await call(helper, "GET", "writer") == "primary"
+    assert await call(helper, "GET", "someone-else") == "replica-a"
+
+
+async def test_pinning_expires_after_the_read_your_writes_window():
+    helper = build_helper(["replica-a"], read_your_writes_seconds=0.1)
+    await call(helper, "POST", "writer")
+    await asyncio.sleep(0.15)
+    assert await call(helper, "GET", "writer") == "replica-a"
+
+
+async def test_pinning_is_shared_across_workers_through_the_store():
+    store = LocalRedis()
+    first, second = build_helper(["replica-a"], store), build_helper(["replica-a"], store)
+    await call(first, "POST", "writer")
+    assert await call(second, "GET", "writer") == "primary"
+    assert await call(second, "GET", "someone-else") == "replica-a"
+
+
+async def test_unreachable_replica_is_skipped_until_its_retry_time():
+    helper = build_helper(["sqlite+aiosqlite:////nonexistent/directory/replica.db", "replica-b"])
+    served = [await call(helper, "GET", f"reader-{n}") for n in range(4)]
+    assert served == ["replica-b"] * 4
+    assert helper._replica_down_until[0] > time.monotonic()
+    assert helper.pool_metrics()["replicas"][0]["healthy"] is False
+
+
+async def test_replica_marked_down_is_skipped_and_primary_serves_when_none_is_left():
+    helper = build_helper(["replica-a", "replica-b"])
+    helper._replica_down_until[0] = time.monotonic() + 30
+    assert [await call(helper, "GET", f"reader-{n}") for n in range(3)] == ["replica-b"] * 3
+    helper._replica_down_until[1] = time.monotonic() + 30
+    assert await call(helper, "GET", "reader") == "primary"
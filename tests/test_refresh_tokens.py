@@ -0,0 +1,87 @@
+"""Refresh token rotation: one use per token, a grace window for racing requests, and family revocation on replay."""
+import asyncio
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+from sqlalchemy import update
+
+from app_v1.core import db_helper, settings
+from app_v1.models import RefreshToken
+from app_v1.repositories import user_repository
+
+pytestmark = pytest.mark.anyio
+
+
+def jti(token: str) -> str:
+    return jwt.decode(token, options={"verify_signature": False})["jti"]
+
+
+async def refresh(client, token: str):
+    return await client.post("/auth/refresh", json={"refresh_token": token})
+
+
+async def end_grace_window(token: str) -> None:
+    # As if the rotation of this token happened longer ago than the grace window.
+    async with db_helper.session_factory() as session:
+        await session.execute(
+            update(RefreshToken).where(RefreshToken.id == jti(token))
+            .values(rotated_at=datetime.utcnow() - timedelta(seconds=settings.jwt_refresh_grace_seconds + 1))
+        )
+        await session.commit()
+
+
+async def test_rotation_issues_a_new_working_pair(client, user):
+    old = user["tokens"]["refresh_token"]
+    response = await refresh(client, old)
+    assert response.status_code == 200
+    tokens = response.json()
+    assert jti(tokens["refresh_token"]) != jti(old)
+    me = await client.get("/resumes/", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert me.status_code == 200
+
+    again = await refresh(client, tokens["refresh_token"])
+    assert again.status_code == 200
+    assert jti(again.json()["refresh_token"]) not in (jti(old), jti(tokens["refresh_token"]))
+
+
+async def test_reuse_within_grace_window_returns_the_same_replacement(client, user):
+    old = user["tokens"]["refresh_token"]
+    first = await refresh(client, old)
+    second = await refresh(client, old)
+    assert first.status_code == second.status_code == 200
+    assert jti(first.json()["refresh_token"]) == jti(second.json()["refresh_token"])
+    assert (await refresh(client, second.json()["refresh_token"])).status_code == 200
+
+
+async def test_concurrent_rotations_share_one_replacement(client, user):
+    responses = await asyncio.gather(*(refresh(client, user["tokens"]["refresh_token"]) for _ in range(5)))
+    assert [response.status_code for response in responses] == [200] * 5
+    assert len({jti(response.json()["refresh_token"]) for response in responses}) == 1
+
+
+async def test_replay_after_grace_window_revokes_the_whole_family(client, user):
+    old = user["tokens"]["refresh_token"]
+    rotated = (await refresh(client, old)).json()["refresh_token"]
+    other_session = (await client.post("/auth/login", data={"username": user["email"],
+                                                             "password": user["password"]})).json()["refresh_token"]
+    await end_grace_window(old)
+
+    replay = await refresh(client, old)
+    assert replay.status_code == 401 and replay.json()["detail"] == "Refresh token revoked"
+    assert (await refresh(client, rotated)).status_code == 401
+    assert (await refresh(client, other_session)).status_code == 401
+
+
+async def test_logged_out_token_cannot_be_rotated(client, user):
+    token = user["tokens"]["refresh_token"]
+    assert (await client.post("/auth/logout", json={"refresh_token": token})).status_code == 204
+    assert (await refresh(client, token)).status_code == 401
+
+
+async def test_email_change_ends_refresh_sessions(client, user):
+    async with db_helper.session_factory() as session:
+        account = await user_repository.get_user_by_email(session, user["email"])
+    changed = await client.patch(f"/users/{account.id}", json={"email": f"new-{user['email']}"})
+    assert changed.status_code == 200
+    assert (await refresh(client, user["tokens"]["refresh_token"])).status_code == 401